@@ -6,6 +6,8 @@ import sqlite3 as sql
 import dask.dataframe as dd
 import pyarrow.csv as pv
 import pyarrow.parquet as pq
+import csv_tools
+import sqlite_tools
 
 # Create Csv file
 fruits = ['Orange', 'Grape', 'Apple', 'Banana', 'Pineapple', 'Avocado']
@@ -29,20 +31,26 @@ conn = sql.connect('mydb.db')
 c = conn.cursor()
 # Executing statement to create a table based on the CSV schema
 c.execute('''CREATE TABLE IF NOT EXISTS mydata (id INTEGER , fruit TEXT, price INTEGER , color TEXT)''')
-df = pd.read_csv('mydata.csv')
 
 # Section 2
 # Loading the into the table
-df.to_sql('mydata', conn, if_exists='append', index = False)
-c.execute('''SELECT * FROM mydata d WHERE d.fruit = 'Banana' AND d.price = 40 AND d.color = 'Blue' ''')
+# the CSV is streamed in batches into large transactions, so the memory use doesn't depend on the file size.
+sqlite_tools.load_csv(conn, 'mydata.csv', 'mydata')
+query_1 = '''SELECT * FROM mydata d WHERE d.fruit = 'Banana' AND d.price = 40 AND d.color = 'Blue' '''
+c.execute(query_1).fetchall()
 
 # Section 3
 # in this SQL statment the projection part is " SELECT * FROM mydata d "
 # and the predicate is "WHERE d.fruit = 'Banana' AND d.price = 40 AND d.color = 'Blue'"
 
-c.execute('''SELECT d.fruit, count(*) FROM mydata d WHERE d.price >50 GROUP BY d.fruit ''')
+query_2 = '''SELECT d.fruit, count(*) FROM mydata d WHERE d.price >50 GROUP BY d.fruit '''
+c.execute(query_2).fetchall()
 # in this SQL statment the projection part is " SELECT d.fruit, count(*) FROM mydata d"
 # and the predicate is "WHERE d.price >50 GROUP BY d.fruit"
+
+# the table has no index, so both queries scan all of it.
+# indexes are created for the queries' predicates, and their latency is compared.
+sqlite_tools.advise_indexes(conn, 'mydata', [query_1, query_2])
 conn.commit()
 conn.close()
 
@@ -50,9 +58,10 @@ conn.close()
 
 # Section 1
 # A function to count the number of lines in a CSV file
-def count_rows(csv_file):
-    with open(csv_file, 'rb') as f:
-        return f.read().decode(encoding='utf-8').count('\n')
+# the file is streamed in binary buffers and the '\n' bytes are counted, without loading or decoding it.
+# with quoting=True a '\n' inside a quoted field doesn't end a line (the same flag is taken by the chunk functions below).
+def count_rows(csv_file, quoting=False):
+    return csv_tools.count_rows(csv_file, quoting=quoting)
 
 # Section 2
 # creating PyArrow Parquet file
@@ -86,27 +95,33 @@ df.to_parquet('mydatapandas.parquet', index=False)
 # Section 1
 # A function to calculates the size of a CSV file in bytes
 def get_csv_size(csv_file):
-    with open(csv_file, 'rb') as f:
-        return len(f.read())
+    return csv_tools.get_file_size(csv_file)
 
 # Section 2
 # A function that returns the number of lines in the first half of the CSV
 # if counts the number of '\n', if the split causes the last line to split, one row is added to the total count.
-def first_chunk(csv_file, middle):
-    with open(csv_file, 'rb') as f:
-        d1 = f.read(middle).decode(encoding='utf-8')
-        if d1[-1] != '\n':
-            number_of_lines = d1.count('\n') + 1
-        else:
-            number_of_lines = d1.count('\n')
-        return number_of_lines
+# with quoting=True a '\n' inside a quoted field is part of the field and doesn't end a line.
+def first_chunk(csv_file, middle, quoting=False):
+    if quoting:
+        number_of_lines, last_byte, in_quotes = csv_tools.count_records(csv_file, 0, middle)
+    else:
+        (number_of_lines, last_byte), in_quotes = csv_tools.count_newlines(csv_file, 0, middle), False
+    if last_byte != b'\n' or in_quotes:
+        number_of_lines += 1
+    return number_of_lines
 
 # A function that returns the number of lines in the second half of the CSV
-def last_chunk(csv_file, middle):
-    with open(csv_file, 'rb') as f:
-        f.seek(middle + 1, 0)
-        d2 = f.read(middle).decode(encoding='utf-8')
-        return d2.count('\n')
+# the second half starts exactly at the middle byte, with quoting=True the first half is scanned for the quote state there.
+# a last line without a trailing '\n' is counted too.
+def last_chunk(csv_file, middle, quoting=False):
+    if quoting:
+        in_quotes = csv_tools.count_records(csv_file, 0, middle)[2]
+        number_of_lines, last_byte, _ = csv_tools.count_records(csv_file, middle, in_quotes=in_quotes)
+    else:
+        number_of_lines, last_byte = csv_tools.count_newlines(csv_file, middle)
+    if last_byte not in (b'', b'\n'):
+        number_of_lines += 1
+    return number_of_lines
 
 csv_file = 'mydata.csv'
 file_byte_size = get_csv_size(csv_file)
@@ -128,18 +143,20 @@ print('Total number of lines in both chunks:{}\n'.format(first_chunk_lines_count
 # Section 4
 # We'll read until the middle byte plus a few bytes to the end of the line we split,
 # maintaining data integrity and solving the wrong line count.
-def first_chunk_plus(csv_file, middle, end):
-    with open(csv_file, 'rb') as f:
-        d1 = f.read(middle).decode(encoding='utf-8')
-        updated_middle = middle
-        for _ in range(end - middle):
-            if d1[-1] != '\n':
-                d1 += f.read(1).decode(encoding='utf-8')
-                updated_middle += 1
-            else:
-                number_of_lines = d1.count('\n')
-                break
-        return number_of_lines, updated_middle
+# the end of the split line is found with a single seek and scan from the middle, with quoting=True skipping quoted newlines.
+def first_chunk_plus(csv_file, middle, end, quoting=False):
+    if quoting:
+        number_of_lines, last_byte, in_quotes = csv_tools.count_records(csv_file, 0, middle)
+    else:
+        (number_of_lines, last_byte), in_quotes = csv_tools.count_newlines(csv_file, 0, middle), False
+    if last_byte == b'\n' and not in_quotes:
+        return number_of_lines, middle
+    if quoting:
+        updated_middle = csv_tools.find_record_end(csv_file, middle, end, in_quotes)
+    else:
+        with open(csv_file, 'rb') as f:
+            updated_middle = csv_tools.find_line_end(f, middle, end)
+    return number_of_lines + 1, updated_middle
 
 first_chunk_lines_count_updated, updated_middle = first_chunk_plus(csv_file, middle, file_byte_size)
 last_chunk_lines_count_updated = last_chunk(csv_file, updated_middle)
@@ -152,21 +169,16 @@ print('Total number of lines in both chunks:{}\n'.format(first_chunk_lines_count
 # In this function we read each chunk based on the chunk_size that was given as an input.
 # if the chunk read results in a line split, we continue to read until we read the entire line.
 # Thus every chunk will have complete lines and will be around the chunk_size that was given as an input.
-def count_chunks(csv_file, chunk_size, file_size):
-    f = open(csv_file, 'rb')
-    chunk_number = 0
+# the chunks are planned first as (offset, length) byte ranges, csv_tools.map_chunks can count them on a process pool.
+# with quoting=True the chunks end at record ends, so a quoted '\n' doesn't split a record.
+def count_chunks(csv_file, chunk_size, file_size, quoting=False):
     total_number_of_lines = 0
-    while True:
-        chunk_number += 1
-        d = f.read(chunk_size).decode(encoding='utf-8')
-        if not d: break
-
-        for i in range(file_size - chunk_number * chunk_size):
-            if d[-1] != '\n':
-                d += f.read(1).decode(encoding='utf-8')
-            else: break
-        number_of_lines_in_chunk = d.count('\n')
-
+    if quoting:
+        chunks, count_chunk = csv_tools.plan_record_chunks(csv_file, chunk_size), csv_tools.count_chunk_rows
+    else:
+        chunks, count_chunk = csv_tools.plan_chunks(csv_file, chunk_size), csv_tools.count_chunk_lines
+    for chunk_number, (offset, length) in enumerate(chunks, 1):
+        number_of_lines_in_chunk = count_chunk(csv_file, offset, length)
         print('Number of lines in chunk{}: {}'.format(chunk_number, number_of_lines_in_chunk))
         total_number_of_lines += number_of_lines_in_chunk
     print('Total number of lines: {}'.format(total_number_of_lines))
@@ -0,0 +1,355 @@
+import csv
+import functools
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Size of the binary buffers the file is streamed with
+BUFFER_SIZE = 16 * 1024 * 1024
+# Size of the reads used to find the end of the line around a chunk boundary
+SCAN_SIZE = 64 * 1024
+
+
+# A function that returns the size of a file in bytes, from its metadata
+def get_file_size(csv_file):
+    return os.stat(csv_file).st_size
+
+
+# A function that counts the b'\n' bytes in the byte range [offset, offset + length) of a file.
+# The range is streamed through a single reusable buffer, so the memory use doesn't depend on the file size
+# and nothing is decoded. It also returns the last byte of the range (b'' for an empty range).
+def count_newlines(csv_file, offset=0, length=None, buffer_size=BUFFER_SIZE):
+    if length is None:
+        length = get_file_size(csv_file) - offset
+    buffer_size = max(1, min(buffer_size, length))
+    buffer = bytearray(buffer_size)
+    view = memoryview(buffer)
+    number_of_newlines = 0
+    last_byte = b''
+    with open(csv_file, 'rb', buffering=0) as f:
+        f.seek(offset)
+        while length > 0:
+            n = f.readinto(view[:min(buffer_size, length)])
+            if not n:
+                break
+            number_of_newlines += buffer.count(b'\n', 0, n)
+            last_byte = buffer[n - 1:n]
+            length -= n
+    return number_of_newlines, bytes(last_byte)
+
+
+# A function that counts the newlines that end a record (RFC 4180) in the byte range [offset, offset + length)
+# of a file, i.e. the b'\n' bytes outside of quoted fields. An escaped quote (b'""') toggles the state twice,
+# so only the parity of the quotes matters. `in_quotes` is the state at `offset`.
+# Buffers without quotes are counted at the speed of `count_newlines`, otherwise the cost is one
+# find per quote. It returns the count, the last byte of the range and the state at its end.
+def count_records(csv_file, offset=0, length=None, in_quotes=False, buffer_size=BUFFER_SIZE):
+    if length is None:
+        length = get_file_size(csv_file) - offset
+    buffer_size = max(1, min(buffer_size, length))
+    buffer = bytearray(buffer_size)
+    view = memoryview(buffer)
+    number_of_records = 0
+    last_byte = b''
+    with open(csv_file, 'rb', buffering=0) as f:
+        f.seek(offset)
+        while length > 0:
+            n = f.readinto(view[:min(buffer_size, length)])
+            if not n:
+                break
+            start = 0
+            while start < n:
+                q = buffer.find(b'"', start, n)
+                end = n if q < 0 else q
+                if not in_quotes:
+                    number_of_records += buffer.count(b'\n', start, end)
+                if q < 0:
+                    break
+                in_quotes = not in_quotes
+                start = q + 1
+            last_byte = buffer[n - 1:n]
+            length -= n
+    return number_of_records, bytes(last_byte), in_quotes
+
+
+# A function that returns the number of rows of a CSV file: the newlines, plus a last row without a trailing
+# newline, without the header row if `header` is True.
+# With `quoting=True` newlines inside quoted fields (RFC 4180) don't end a row. That relies on the quotes being
+# balanced, a single stray quote makes the rest of the file one field, so it isn't the default.
+def count_rows(csv_file, header=False, buffer_size=BUFFER_SIZE, quoting=False):
+    if quoting:
+        number_of_rows, last_byte, _ = count_records(csv_file, buffer_size=buffer_size)
+    else:
+        number_of_rows, last_byte = count_newlines(csv_file, buffer_size=buffer_size)
+    if last_byte not in (b'', b'\n'):
+        number_of_rows += 1
+    if header and number_of_rows > 0:
+        number_of_rows -= 1
+    return number_of_rows
+
+
+# A function that returns the offset where the line containing byte `offset - 1` ends, i.e. the first
+# offset >= `offset` that starts a line (or the file size). It seeks once and scans forward in small reads,
+# so the cost is the length of the split line and not the offset.
+def find_line_end(f, offset, file_size):
+    if offset <= 0 or offset >= file_size:
+        return min(max(offset, 0), file_size)
+    f.seek(offset - 1)
+    position = offset - 1
+    while True:
+        d = f.read(SCAN_SIZE)
+        if not d:
+            return file_size
+        i = d.find(b'\n')
+        if i >= 0:
+            return position + i + 1
+        position += len(d)
+
+
+# A function that scans the byte range [offset, offset + length) of a CSV file for its first record boundary
+# without knowing whether `offset` is inside a quoted field (speculative quote parity scanning).
+# It returns the number of quotes in the range and, for each state at `offset` (outside / inside quotes),
+# the offset just after the first newline that ends a record in the range (None if there is none).
+# Once both are found the rest of the range only has its quotes counted.
+def scan_quotes(csv_file, offset, length, buffer_size=BUFFER_SIZE):
+    buffer_size = max(1, min(buffer_size, length))
+    buffer = bytearray(buffer_size)
+    view = memoryview(buffer)
+    number_of_quotes = 0
+    record_ends = [None, None]
+    position = offset
+    with open(csv_file, 'rb', buffering=0) as f:
+        f.seek(offset)
+        while length > 0:
+            n = f.readinto(view[:min(buffer_size, length)])
+            if not n:
+                break
+            start = 0
+            while None in record_ends and start < n:
+                q = buffer.find(b'"', start, n)
+                end = n if q < 0 else q
+                # A newline here ends a record if the state at `offset` is the current parity
+                parity = number_of_quotes % 2
+                if record_ends[parity] is None:
+                    i = buffer.find(b'\n', start, end)
+                    if i >= 0:
+                        record_ends[parity] = position + i + 1
+                if q < 0:
+                    start = n
+                    break
+                number_of_quotes += 1
+                start = q + 1
+            number_of_quotes += buffer.count(b'"', start, n)
+            position += n
+            length -= n
+    return number_of_quotes, record_ends
+
+
+# A function that returns the offset just after the first record end at or after `offset` (or the file size),
+# given the quote state at `offset`. Like `find_line_end` it scans forward in small reads.
+def find_record_end(csv_file, offset, file_size, in_quotes=False):
+    while offset < file_size:
+        number_of_quotes, record_ends = scan_quotes(csv_file, offset, min(SCAN_SIZE, file_size - offset))
+        if record_ends[in_quotes] is not None:
+            return record_ends[in_quotes]
+        in_quotes = in_quotes != (number_of_quotes % 2 == 1)
+        offset += SCAN_SIZE
+    return file_size
+
+
+# A function that splits a file into (offset, length) byte ranges of about `chunk_size` bytes,
+# each made of whole lines. Every boundary is found independently of the others by `find_line_end`.
+# Newlines inside quoted fields aren't recognized, see `plan_record_chunks` for such files.
+def plan_chunks(csv_file, chunk_size):
+    file_size = get_file_size(csv_file)
+    boundaries = [0]
+    with open(csv_file, 'rb') as f:
+        for target in range(chunk_size, file_size, chunk_size):
+            boundary = find_line_end(f, max(target, boundaries[-1]), file_size)
+            if boundary > boundaries[-1]:
+                boundaries.append(boundary)
+    if boundaries[-1] < file_size:
+        boundaries.append(file_size)
+    return [(start, end - start) for start, end in zip(boundaries[:-1], boundaries[1:])]
+
+
+# A function that splits a CSV file into (offset, length) byte ranges of about `chunk_size` bytes,
+# each made of whole records, where quoted fields may contain newlines.
+# The file is cut into fixed segments which are scanned in parallel by `scan_quotes` for both possible
+# quote states at their start. Then a serial fix up sums the quote counts of the segments to know the
+# actual state at each segment, and picks the matching boundary (a segment with none joins the next chunk).
+def plan_record_chunks(csv_file, chunk_size, pool=None):
+    file_size = get_file_size(csv_file)
+    segments = [(offset, min(chunk_size, file_size - offset)) for offset in range(chunk_size, file_size, chunk_size)]
+    if pool is None or len(segments) < 2:
+        scans = [scan_quotes(csv_file, offset, length) for offset, length in segments]
+    else:
+        scans = list(pool.map(scan_quotes, [csv_file] * len(segments), *zip(*segments)))
+    boundaries = [0]
+    number_of_quotes = count_records(csv_file, 0, min(chunk_size, file_size))[2]
+    for number_of_quotes_in_segment, record_ends in scans:
+        boundary = record_ends[number_of_quotes % 2]
+        if boundary is not None:
+            boundaries.append(boundary)
+        number_of_quotes += number_of_quotes_in_segment
+    if boundaries[-1] < file_size:
+        boundaries.append(file_size)
+    return [(start, end - start) for start, end in zip(boundaries[:-1], boundaries[1:])]
+
+
+# A function that returns the number of rows in the byte range [offset, offset + length) of a CSV file,
+# which starts outside of a quoted field (as the chunks of `plan_record_chunks`),
+# a last row without a trailing newline included. Used as the map function of `map_chunks` with `quoting=True`.
+def count_chunk_rows(csv_file, offset, length):
+    number_of_rows, last_byte, _ = count_records(csv_file, offset, length)
+    if last_byte not in (b'', b'\n'):
+        number_of_rows += 1
+    return number_of_rows
+
+
+# A function that returns the number of lines in the byte range [offset, offset + length) of a file which starts
+# a line (as the chunks of `plan_chunks`), a last line without a trailing newline included.
+# Used as the map function of `map_chunks` with `quoting=False`.
+def count_chunk_lines(csv_file, offset, length):
+    number_of_lines, last_byte = count_newlines(csv_file, offset, length)
+    if last_byte not in (b'', b'\n'):
+        number_of_lines += 1
+    return number_of_lines
+
+
+# A function that applies `map_func(csv_file, offset, length)` to the record aligned chunks of a file
+# on a process pool, and combines the per chunk results with `reduce_func(a, b)`
+# (the list of the per chunk results is returned if it's None). `initial` is the result of the reduce when the file
+# is empty (no chunks) and, if given, it's also reduced first with the per chunk results, as in `functools.reduce`.
+# `map_func` and `reduce_func` must be module level functions so they can be sent to the workers.
+# By default every newline is taken as a record boundary, as in `count_rows`. With `quoting=True` the chunks end
+# at record ends (see `plan_record_chunks`), so newlines inside quoted fields don't split a record.
+def map_chunks(csv_file, map_func, reduce_func=None, chunk_size=64 * 1024 * 1024, num_workers=None, quoting=False, initial=None):
+    with ProcessPoolExecutor(num_workers) as pool:
+        if quoting:
+            chunks = plan_record_chunks(csv_file, chunk_size, pool)
+        else:
+            chunks = plan_chunks(csv_file, chunk_size)
+        results = list(pool.map(map_func, [csv_file] * len(chunks), *zip(*chunks)))
+    if reduce_func is None:
+        return results
+    if initial is not None:
+        return functools.reduce(reduce_func, results, initial)
+    if not results:
+        return None
+    return functools.reduce(reduce_func, results)
+
+
+# A function that counts the rows of a CSV file in parallel (the same result as `count_rows`)
+def parallel_count_rows(csv_file, header=False, chunk_size=64 * 1024 * 1024, num_workers=None, quoting=False):
+    if get_file_size(csv_file) == 0:
+        return 0
+    map_func = count_chunk_rows if quoting else count_chunk_lines
+    number_of_rows = sum(map_chunks(csv_file, map_func, chunk_size=chunk_size, num_workers=num_workers, quoting=quoting))
+    if header and number_of_rows > 0:
+        number_of_rows -= 1
+    return number_of_rows
+
+
+# A function that measures the throughput of `count_rows` in GB/s (best of `repeats` runs).
+# The first run also warms up the page cache, so the result is the in memory scan speed.
+def benchmark_count_rows(csv_file, repeats=3, buffer_size=BUFFER_SIZE, quoting=False):
+    file_size = get_file_size(csv_file)
+    best_time = float('inf')
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        number_of_rows = count_rows(csv_file, buffer_size=buffer_size, quoting=quoting)
+        best_time = min(best_time, time.perf_counter() - start_time)
+    gb_per_sec = file_size / best_time / 1e9
+    print('Counted {} rows of {:.1f} MB in {:.3f} sec: {:.2f} GB/s'.format(number_of_rows, file_size / 1e6, best_time, gb_per_sec))
+    return gb_per_sec
+
+
+# A function that measures the throughput of `parallel_count_rows` in GB/s for 1, 2, 4, .. workers
+def benchmark_parallel_count_rows(csv_file, chunk_size=16 * 1024 * 1024, repeats=3, quoting=False):
+    file_size = get_file_size(csv_file)
+    results = {}
+    num_workers = 1
+    while num_workers <= os.cpu_count():
+        best_time = float('inf')
+        for _ in range(repeats):
+            start_time = time.perf_counter()
+            parallel_count_rows(csv_file, chunk_size=chunk_size, num_workers=num_workers, quoting=quoting)
+            best_time = min(best_time, time.perf_counter() - start_time)
+        results[num_workers] = file_size / best_time / 1e9
+        print('{} workers: {:.2f} GB/s'.format(num_workers, results[num_workers]))
+        num_workers *= 2
+    return results
+
+
+# A function that writes a CSV file like mydata.csv with `number_of_rows` rows, for the benchmarks
+def write_sample_csv(csv_file, number_of_rows):
+    fruits = ['Orange', 'Grape', 'Apple', 'Banana', 'Pineapple', 'Avocado']
+    colors = ['Red', 'Green', 'Yellow', 'Blue']
+    with open(csv_file, 'w', newline='') as f:
+        f.write('id,fruit,price,color\n')
+        for i in range(1, number_of_rows + 1):
+            f.write('{},{},{},{}\n'.format(i, fruits[i % 6], 10 + i % 91, colors[i % 4]))
+
+
+# A function that writes a CSV file whose records are hard to split: quoted fields with newlines, CRLF,
+# escaped quotes and empty fields, with or without a trailing newline. It returns the offset after each record.
+def write_adversarial_csv(csv_file, number_of_rows, seed=0):
+    rng = random.Random(seed)
+    pieces = ['', 'a', '"', '""', '\n', '\r\n', ',', ' ', 'x' * 40, '"\n"', '\n\n']
+    record_ends = []
+    with open(csv_file, 'wb') as f:
+        for i in range(number_of_rows):
+            fields = [''.join(rng.choice(pieces) for _ in range(rng.randint(0, 4))) for _ in range(rng.randint(1, 4))]
+            line = _format_csv_record(fields, rng.choice(['\n', '\r\n']))
+            if i == number_of_rows - 1 and rng.random() < 0.5:
+                line = line.rstrip(b'\r\n')
+            f.write(line)
+            record_ends.append(f.tell())
+    return record_ends
+
+
+def _format_csv_record(fields, line_terminator):
+    output = io.StringIO()
+    csv.writer(output, lineterminator=line_terminator, quoting=csv.QUOTE_MINIMAL).writerow(fields)
+    return output.getvalue().encode('utf-8')
+
+
+# A self check of the quote aware chunking on adversarial files: the rows counted serially, per chunk and
+# in parallel must match the csv module, and every chunk must end exactly at the end of a record.
+def check_record_chunks(number_of_files=50, number_of_rows=200, num_workers=2):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_file = os.path.join(tmp_dir, 'adversarial.csv')
+        for seed in range(number_of_files):
+            record_ends = set(write_adversarial_csv(csv_file, number_of_rows, seed))
+            with open(csv_file, newline='', encoding='utf-8') as f:
+                expected_rows = sum(1 for _ in csv.reader(f))
+            assert count_rows(csv_file, quoting=True) == expected_rows, seed
+            file_size = get_file_size(csv_file)
+            for chunk_size in (1, 2, 3, 7, 64, 1000, file_size + 1):
+                chunks = plan_record_chunks(csv_file, chunk_size)
+                assert sum(length for _, length in chunks) == file_size, (seed, chunk_size)
+                assert all(offset + length in record_ends for offset, length in chunks), (seed, chunk_size)
+                assert sum(count_chunk_rows(csv_file, *chunk) for chunk in chunks) == expected_rows, (seed, chunk_size)
+        assert parallel_count_rows(csv_file, chunk_size=97, num_workers=num_workers, quoting=True) == expected_rows
+        assert parallel_count_rows(csv_file, chunk_size=97, num_workers=num_workers) == count_rows(csv_file)
+    print('Checked the record chunks of {} adversarial files'.format(number_of_files))
+
+
+if __name__ == '__main__':
+    # Benchmark on the given CSV file, or on a generated one
+    if len(sys.argv) > 1 and sys.argv[1] == '--check':
+        check_record_chunks()
+    elif len(sys.argv) > 1:
+        benchmark_count_rows(sys.argv[1])
+        benchmark_parallel_count_rows(sys.argv[1])
+    else:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            csv_file = os.path.join(tmp_dir, 'mydata.csv')
+            write_sample_csv(csv_file, 5000000)
+            benchmark_count_rows(csv_file)
+            benchmark_parallel_count_rows(csv_file)
@@ -0,0 +1,247 @@
+import os
+import re
+import sqlite3 as sql
+import sys
+import tempfile
+import time
+
+import csv_tools
+
+# Number of CSV rows read and inserted at a time
+BATCH_SIZE = 100000
+# Number of rows inserted in each transaction
+ROWS_PER_TRANSACTION = 1000000
+
+
+# A function that maps pandas / pyarrow column types to SQLite column types
+def sqlite_type(column_type):
+    name = str(column_type).lower()
+    if name.startswith(('int', 'uint', 'bool')):
+        return 'INTEGER'
+    if name.startswith(('float', 'double', 'halffloat')):
+        return 'REAL'
+    return 'TEXT'
+
+
+# A function that reads a CSV file in batches of at most `batch_size` rows, so the memory use is flat.
+# It yields the column names and types of the first batch, and then each batch as an iterable of row tuples.
+def iter_csv_batches(csv_file, batch_size=BATCH_SIZE, engine='pandas'):
+    if engine == 'pyarrow':
+        import pyarrow.csv as pv
+        # Empty fields are read as NULL, as pandas does
+        reader = pv.open_csv(csv_file, convert_options=pv.ConvertOptions(strings_can_be_null=True))
+        yield [(field.name, field.type) for field in reader.schema]
+        for record_batch in reader:
+            for start in range(0, record_batch.num_rows, batch_size):
+                batch = record_batch.slice(start, batch_size)
+                yield zip(*(column.to_pylist() for column in batch.columns))
+    else:
+        import pandas as pd
+        is_first = True
+        for df in pd.read_csv(csv_file, chunksize=batch_size):
+            if is_first:
+                yield list(df.dtypes.items())
+                is_first = False
+            # NaN values are stored by SQLite as NULL
+            yield df.itertuples(index=False, name=None)
+
+
+# A function that streams a CSV file into a SQLite table with `executemany`, committing every
+# `rows_per_transaction` rows. The table is created from the CSV columns if it doesn't exist.
+# During the load the journal is in WAL mode and synchronous is OFF (a crash may corrupt the database
+# while loading), both are restored afterwards. The indexes in `indexes` (lists of columns) are created
+# after the load, which is faster than updating them per row. It returns the number of rows and the load time.
+def load_csv(conn, csv_file, table, batch_size=BATCH_SIZE, rows_per_transaction=ROWS_PER_TRANSACTION, indexes=None, engine='pandas'):
+    start_time = time.perf_counter()
+    if conn.in_transaction:
+        conn.commit()
+    journal_mode = conn.execute('PRAGMA journal_mode').fetchone()[0]
+    synchronous = conn.execute('PRAGMA synchronous').fetchone()[0]
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = OFF')
+    number_of_rows = 0
+    try:
+        batches = iter_csv_batches(csv_file, batch_size, engine)
+        columns = next(batches)
+        conn.execute('CREATE TABLE IF NOT EXISTS {} ({})'.format(
+            table, ', '.join('{} {}'.format(name, sqlite_type(column_type)) for name, column_type in columns)))
+        insert_sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+            table, ', '.join(name for name, _ in columns), ', '.join(['?'] * len(columns)))
+        rows_in_transaction = 0
+        for batch in batches:
+            if not conn.in_transaction:
+                conn.execute('BEGIN')
+            cursor = conn.executemany(insert_sql, batch)
+            number_of_rows += cursor.rowcount
+            rows_in_transaction += cursor.rowcount
+            if rows_in_transaction >= rows_per_transaction:
+                conn.commit()
+                rows_in_transaction = 0
+        conn.commit()
+        for index_columns in indexes or []:
+            create_index(conn, table, index_columns)
+    finally:
+        if conn.in_transaction:
+            conn.rollback()
+        conn.execute('PRAGMA synchronous = {}'.format(synchronous))
+        conn.execute('PRAGMA journal_mode = {}'.format(journal_mode))
+    load_time = time.perf_counter() - start_time
+    print('Loaded {} rows into {} in {:.2f} sec: {:.0f} rows/sec'.format(number_of_rows, table, load_time, number_of_rows / max(load_time, 1e-9)))
+    return number_of_rows, load_time
+
+
+# A function that creates an index on the given columns of a table (named after them)
+def create_index(conn, table, index_columns):
+    index_name = 'idx_{}_{}'.format(table, '_'.join(index_columns))
+    conn.execute('CREATE INDEX IF NOT EXISTS {} ON {} ({})'.format(index_name, table, ', '.join(index_columns)))
+    conn.commit()
+    return index_name
+
+
+# A function that returns the details of the EXPLAIN QUERY PLAN of a query
+def explain_query_plan(conn, query):
+    return [row[-1] for row in conn.execute('EXPLAIN QUERY PLAN ' + query)]
+
+
+# A function that returns the latency of a query in seconds, the best of `repeats` runs of it with its rows fetched
+def time_query(conn, query, repeats=3):
+    best_time = float('inf')
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        conn.execute(query).fetchall()
+        best_time = min(best_time, time.perf_counter() - start_time)
+    return best_time
+
+
+# A function that returns the columns a single table query uses: its projection (None for *), the columns
+# compared to a value by equality (=, IN, IS) and by range (<, >, BETWEEN, LIKE 'prefix%') in a WHERE of ANDed
+# predicates, all the columns the WHERE references, and its GROUP BY and ORDER BY columns.
+# The LIKE ranges come after the others, since SQLite only seeks on them with case_sensitive_like or a NOCASE column.
+# Identifiers which aren't columns of the table (aliases, functions, keywords, string literals) are dropped.
+def parse_query(query, columns):
+    query = ' '.join(query.split())
+    query = re.sub(r'\b\w+\.(\w+)', r'\1', query)
+    select = re.search(r'^SELECT\s+(.*?)\s+FROM\b', query, re.I).group(1)
+    where = re.search(r'\bWHERE\s+(.*?)(?=\bGROUP\s+BY\b|\bORDER\s+BY\b|\bLIMIT\b|$)', query, re.I)
+    group_by = re.search(r'\b(?:GROUP|ORDER)\s+BY\s+(.*?)(?=\bHAVING\b|\bLIMIT\b|$)', query, re.I)
+    equality, ranges, prefixes = [], [], []
+    if where and not re.search(r'\bOR\b', where.group(1), re.I):
+        # The AND of a BETWEEN doesn't separate predicates
+        predicates = re.sub(r'(\bBETWEEN\s.*?\s)AND\b', r'\1&', where.group(1), flags=re.I)
+        for predicate in re.split(r'\bAND\b', predicates, flags=re.I):
+            match = re.match(r"\s*(\w+)\s*(==|=|<=|>=|<>|!=|<|>|IN\b|BETWEEN\b|IS NOT\b|IS\b|LIKE '[^%_'])", predicate, re.I)
+            if match and match.group(1) in columns:
+                operator = match.group(2).upper()
+                if operator in ('=', '==', 'IN', 'IS'):
+                    equality.append(match.group(1))
+                elif operator in ('<', '<=', '>', '>=', 'BETWEEN'):
+                    ranges.append(match.group(1))
+                elif operator.startswith('LIKE'):
+                    prefixes.append(match.group(1))
+    def referenced(clause):
+        clause = re.sub(r"'(?:[^']|'')*'", "''", clause)
+        return [name for name in re.findall(r'\b(\w+)\b(?!\s*\()', clause) if name in columns]
+    projection = None if select.strip() == '*' else referenced(select)
+    filtering = referenced(where.group(1)) if where else []
+    grouping = referenced(group_by.group(1)) if group_by else []
+    return projection, equality, ranges + prefixes, filtering, grouping
+
+
+# A function that proposes an index for a query: the columns compared by equality, then the first column
+# compared by range (the index can only seek on one range), then if the query doesn't select * the rest
+# of the columns it uses, including every column of its WHERE, so the index covers it and the table isn't read at all.
+def propose_index(query, columns):
+    projection, equality, ranges, filtering, grouping = parse_query(query, columns)
+    index_columns = list(dict.fromkeys(equality + ranges[:1]))
+    if projection is not None:
+        index_columns += [name for name in dict.fromkeys(ranges[1:] + filtering + grouping + projection) if name not in index_columns]
+    return index_columns
+
+
+# A function that returns the columns of each index of a table
+def list_indexes(conn, table):
+    return {row[1]: [column[2] for column in conn.execute('PRAGMA index_info({})'.format(row[1]))]
+            for row in conn.execute('PRAGMA index_list({})'.format(table))}
+
+
+# A function that rebuilds a table so `column` is an INTEGER PRIMARY KEY, i.e. the rowid of the table,
+# which makes lookups by it a rowid search and saves storing it twice. The values must be unique and not NULL.
+# The indexes of the table are dropped with it. It returns whether `column` is the rowid.
+def make_rowid_primary_key(conn, table, column):
+    table_info = conn.execute('PRAGMA table_info({})'.format(table)).fetchall()
+    if any(name == column and pk and column_type.upper() == 'INTEGER' for _, name, column_type, _, _, pk in table_info):
+        return True
+    is_unique = conn.execute('SELECT count({0}) = count(*) AND count(DISTINCT {0}) = count(*) FROM {1}'.format(column, table)).fetchone()[0]
+    if not is_unique:
+        print('{}.{} has NULL or repeated values, it is not made the rowid'.format(table, column))
+        return False
+    definitions = ['{} INTEGER PRIMARY KEY'.format(name) if name == column else '{} {}'.format(name, column_type)
+                   for _, name, column_type, _, _, _ in table_info]
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute('BEGIN')
+    try:
+        conn.execute('CREATE TABLE {}_rowid ({})'.format(table, ', '.join(definitions)))
+        conn.execute('INSERT INTO {0}_rowid SELECT * FROM {0} ORDER BY {1}'.format(table, column))
+        conn.execute('DROP TABLE {}'.format(table))
+        conn.execute('ALTER TABLE {0}_rowid RENAME TO {0}'.format(table))
+        conn.commit()
+    except sql.Error:
+        conn.rollback()
+        raise
+    return True
+
+
+# A function that indexes a table for a workload of queries on it. Each query whose EXPLAIN QUERY PLAN
+# still scans the table (with the indexes created for the previous queries) gets the index of `propose_index`,
+# unless an existing index starts with its columns. A full scan of an index counts as a scan too when the
+# proposed index starts with a column the query compares, so it can be searched instead.
+# If `rowid_column` is given it first becomes the INTEGER PRIMARY KEY (see `make_rowid_primary_key`).
+# The tables statistics are refreshed by ANALYZE, and the plan and the latency of each query before and
+# after are printed and returned.
+def advise_indexes(conn, table, queries, rowid_column=None, repeats=3):
+    report = [{'query': query, 'plan_before': explain_query_plan(conn, query), 'time_before': time_query(conn, query, repeats)}
+              for query in queries]
+    if rowid_column is not None:
+        make_rowid_primary_key(conn, table, rowid_column)
+    columns = [row[1] for row in conn.execute('PRAGMA table_info({})'.format(table))]
+    for query_report in report:
+        index_columns = propose_index(query_report['query'], columns)
+        _, equality, ranges, _, _ = parse_query(query_report['query'], columns)
+        is_searchable = bool(index_columns) and index_columns[0] in equality + ranges
+        is_scan = any(detail.startswith('SCAN') and (is_searchable or 'INDEX' not in detail)
+                      for detail in explain_query_plan(conn, query_report['query']))
+        is_indexed = any(existing[:len(index_columns)] == index_columns for existing in list_indexes(conn, table).values())
+        query_report['index'] = None
+        if is_scan and index_columns and not is_indexed:
+            query_report['index'] = create_index(conn, table, index_columns)
+    conn.execute('ANALYZE {}'.format(table))
+    conn.commit()
+    for query_report in report:
+        query_report['plan_after'] = explain_query_plan(conn, query_report['query'])
+        query_report['time_after'] = time_query(conn, query_report['query'], repeats)
+        print(query_report['query'].strip())
+        print('    index: {}'.format(query_report['index']))
+        print('    plan:  {} -> {}'.format('; '.join(query_report['plan_before']), '; '.join(query_report['plan_after'])))
+        print('    time:  {:.2f} ms -> {:.2f} ms ({:.1f}x)'.format(1e3 * query_report['time_before'], 1e3 * query_report['time_after'],
+                                                           query_report['time_before'] / max(query_report['time_after'], 1e-9)))
+    return report
+
+
+if __name__ == '__main__':
+    # Load the given CSV file, or a generated one, into a new database and report the rows/sec
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if len(sys.argv) > 1:
+            csv_file = sys.argv[1]
+        else:
+            csv_file = os.path.join(tmp_dir, 'mydata.csv')
+            csv_tools.write_sample_csv(csv_file, 1000000)
+        for engine in ('pandas', 'pyarrow'):
+            conn = sql.connect(os.path.join(tmp_dir, 'mydb_{}.db'.format(engine)))
+            load_csv(conn, csv_file, 'mydata', engine=engine)
+            conn.close()
+        # Index the database for the Task 1 queries
+        conn = sql.connect(os.path.join(tmp_dir, 'mydb_pandas.db'))
+        advise_indexes(conn, 'mydata', ["SELECT * FROM mydata d WHERE d.fruit = 'Banana' AND d.price = 40 AND d.color = 'Blue'",
+                                        'SELECT d.fruit, count(*) FROM mydata d WHERE d.price > 50 GROUP BY d.fruit'], rowid_column='id')
+        conn.close()
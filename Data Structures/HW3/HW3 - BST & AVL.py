@@ -1,13 +1,32 @@
 NO_ITEM = -1
 OK = 0
+# insert_many/delete_many rebuild the whole tree once the batch is at least this fraction of the tree size
+BULK_REBUILD_RATIO = 0.5
+# AVL.insert_many/delete_many merge a batch filling g gaps of the tree with split/join instead of pushing it down
+# the tree when MERGE_COST * g * log2(n / g + 1) is below m * log2(n) for n keys in the tree and m in the batch
+MERGE_COST = 8
+# Number of batch keys whose rank is looked up to estimate the gaps the batch fills
+MERGE_SAMPLES = 32
+# insert_many (and AVL.delete_many) stop pushing a batch down the tree once at most this many of its keys are left
+# in a subtree, and insert or remove them one at a time from its root
+DESCENT_RUN = 4
+import gc
+import math
+import mmap
+import pickle
 import random
-import sys
-sys.setrecursionlimit(10**6)
+import struct
+import time
+import tracemalloc
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import islice
 
 class Node:
     """
     BST Node
     """
+    __slots__ = ('key', 'value', 'left', 'right')
 
     def __init__(self, key, value=None, left=None, right=None):
         """
@@ -30,6 +49,7 @@ class BST:
     """
     BST Data Structure
     """
+    node_class = Node
 
     def __init__(self, root=None):
         """
@@ -196,39 +216,406 @@ class BST:
                 return cur
         return cur
 
+    def find_maximum(self, node):
+        """
+        finds the node with the maximum key in the right subtree of a node
+        :param node: Node
+        :return: the maximum node or the node itself if there is no right subtree
+        """
+        cur = node
+        while cur.right is not None:
+            cur = cur.right
+        return cur
+
+    def min(self):
+        """
+        :return: the Node with the smallest key or None if the BST is empty
+        """
+        return self.find_minimum(self.root) if self.root is not None else None
+
+    def max(self):
+        """
+        :return: the Node with the largest key or None if the BST is empty
+        """
+        return self.find_maximum(self.root) if self.root is not None else None
+
+    def floor(self, key):
+        """
+        :param key: int
+        :return: the Node with the largest key <= key or None if there is no such Node
+        """
+        cur = self.root
+        best = None
+        while cur is not None:
+            if key > cur.key:
+                best = cur
+                cur = cur.right
+            elif key < cur.key:
+                cur = cur.left
+            else:
+                return cur
+        return best
+
+    def ceiling(self, key):
+        """
+        :param key: int
+        :return: the Node with the smallest key >= key or None if there is no such Node
+        """
+        cur = self.root
+        best = None
+        while cur is not None:
+            if key < cur.key:
+                best = cur
+                cur = cur.left
+            elif key > cur.key:
+                cur = cur.right
+            else:
+                return cur
+        return best
+
+    def successor(self, key):
+        """
+        key does not have to be in the BST
+        :param key: int
+        :return: the Node with the smallest key > key or None if there is no such Node
+        """
+        cur = self.root
+        best = None
+        while cur is not None:
+            if key < cur.key:
+                best = cur
+                cur = cur.left
+            else:
+                cur = cur.right
+        return best
+
+    def predecessor(self, key):
+        """
+        key does not have to be in the BST
+        :param key: int
+        :return: the Node with the largest key < key or None if there is no such Node
+        """
+        cur = self.root
+        best = None
+        while cur is not None:
+            if key > cur.key:
+                best = cur
+                cur = cur.right
+            else:
+                cur = cur.left
+        return best
+
+    def range(self, lo=None, hi=None, items=False):
+        """
+        Lazily walk the keys in [lo, hi) in sorted order, in O(log n + k) for k keys
+        :param lo: int, inclusive lower bound or None for no lower bound
+        :param hi: int, exclusive upper bound or None for no upper bound
+        :param items: yield (key, value) pairs instead of keys
+        :return: generator of keys in sorted order
+        """
+        stack = []
+        cur = self.root
+        while cur is not None:
+            if lo is None or cur.key >= lo:
+                stack.append(cur)
+                cur = cur.left
+            else:
+                cur = cur.right
+        while stack:
+            cur = stack.pop()
+            if hi is not None and cur.key >= hi:
+                return
+            yield (cur.key, cur.value) if items else cur.key
+            cur = cur.right
+            while cur is not None:
+                stack.append(cur)
+                cur = cur.left
+
+    def __iter__(self):
+        return self.iter_inorder()
+
+    def iter_nodes(self):
+        """
+        Lazily walk the BST in inorder using an explicit stack of at most height nodes
+        :return: generator of Nodes in sorted order
+        """
+        stack = []
+        cur = self.root
+        while stack or cur is not None:
+            while cur is not None:
+                stack.append(cur)
+                cur = cur.left
+            cur = stack.pop()
+            yield cur
+            cur = cur.right
+
+    def iter_inorder(self, items=False):
+        """
+        Lazily walk the BST in inorder using an explicit stack of at most height nodes
+        :param items: yield (key, value) pairs instead of keys
+        :return: generator of keys in sorted order
+        """
+        for node in self.iter_nodes():
+            yield (node.key, node.value) if items else node.key
+
+    def iter_preorder(self, items=False):
+        """
+        Lazily walk the BST in preorder using an explicit stack
+        :param items: yield (key, value) pairs instead of keys
+        :return: generator of keys in preorder
+        """
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            cur = stack.pop()
+            yield (cur.key, cur.value) if items else cur.key
+            if cur.right is not None:
+                stack.append(cur.right)
+            if cur.left is not None:
+                stack.append(cur.left)
+
+    def iter_postorder(self, items=False):
+        """
+        Lazily walk the BST in postorder using an explicit stack of at most height nodes
+        :param items: yield (key, value) pairs instead of keys
+        :return: generator of keys in postorder
+        """
+        stack = []
+        last = None
+        cur = self.root
+        while stack or cur is not None:
+            if cur is not None:
+                stack.append(cur)
+                cur = cur.left
+                continue
+            top = stack[-1]
+            if top.right is not None and top.right is not last:
+                cur = top.right
+            else:
+                yield (top.key, top.value) if items else top.key
+                last = stack.pop()
+
     def inorder_traversal(self):
         """
         :return: an array (Python list) of keys sorted according to the inorder traversal of self
         """
-        if self.root is None:
-            return []
-        array = BST(self.root.left).inorder_traversal()
-        array.append(self.root.key)
-        array += BST(self.root.right).inorder_traversal()
-
-        return array
+        return list(self.iter_inorder())
 
     def preorder_traversal(self):
         """
         :return: an array (Python list) of keys sorted according to the preorder traversal of self
         """
-        if self.root is None:
-            return []
-        array = [self.root.key]
-        array += BST(self.root.left).preorder_traversal()
-        array += BST(self.root.right).preorder_traversal()
-        return array
+        return list(self.iter_preorder())
 
     def postorder_traversal(self):
         """
         :return: an array (Python list) of keys sorted according to the postorder traversal of self
         """
-        if self.root is None:
-            return []
-        array = BST(self.root.left).postorder_traversal()
-        array += BST(self.root.right).postorder_traversal()
-        array.append(self.root.key)
-        return array
+        return list(self.iter_postorder())
+
+    def link_sorted_nodes(self, nodes, lo, hi):
+        """
+        Relink nodes[lo:hi], which are sorted by key, into a balanced subtree
+        :param nodes: list of Node
+        :return: the root of the subtree or None if the range is empty
+        """
+        if lo >= hi:
+            return None
+        mid = (lo + hi) // 2
+        node = nodes[mid]
+        node.left = self.link_sorted_nodes(nodes, lo, mid)
+        node.right = self.link_sorted_nodes(nodes, mid + 1, hi)
+        return node
+
+    def is_small_against(self, batch_size):
+        """
+        :param batch_size: int
+        :return: True if a batch of batch_size keys is large enough to rebuild the tree instead
+        """
+        limit = int(batch_size / BULK_REBUILD_RATIO)
+        return sum(1 for _ in islice(self.iter_nodes(), limit + 1)) <= limit
+
+    def rebuild(self, keys, values=None, delete=False):
+        """
+        Merge the sorted batch with the nodes of the tree in one pass and relink everything into a balanced tree.
+        Surviving nodes are reused, so only the inserted keys allocate.
+        :param keys: sorted list of distinct keys
+        :param values: list of values matching keys, used when inserting
+        :param delete: remove the batch keys instead of inserting them
+        :return: number of keys of the batch that were found in the tree
+        """
+        nodes = []
+        found = 0
+        i = 0
+        for node in self.iter_nodes():
+            while i < len(keys) and keys[i] < node.key:
+                if not delete:
+                    nodes.append(self.node_class(keys[i], values[i]))
+                i += 1
+            if i < len(keys) and keys[i] == node.key:
+                found += 1
+                if delete:
+                    i += 1
+                    continue
+                node.value = values[i]
+                i += 1
+            nodes.append(node)
+        if not delete:
+            nodes.extend(self.node_class(keys[j], values[j]) for j in range(i, len(keys)))
+        self.root = self.link_sorted_nodes(nodes, 0, len(nodes))
+        return found
+
+    def insert_below(self, node, key, value):
+        """
+        Inserts a (key,value) pair into the non empty subtree rooted at node, or updates the value of key
+        :param node: Node
+        """
+        while True:
+            if key < node.key:
+                if node.left is None:
+                    node.left = self.node_class(key, value)
+                    return
+                node = node.left
+            elif key > node.key:
+                if node.right is None:
+                    node.right = self.node_class(key, value)
+                    return
+                node = node.right
+            else:
+                node.value = value
+                return
+
+    def insert_many(self, items):
+        """
+        Inserts a batch of (key,value) pairs, updating the values of existing keys.
+        The batch is sorted once and pushed down the tree together, so keys sharing a path share its descent
+        and every run of keys landing on the same empty spot becomes a balanced subtree.
+        The last few keys of a subtree (DESCENT_RUN) are inserted one at a time from its root.
+        Batches large compared to the tree are merged with it and rebuilt instead.
+        :param items: iterable of (key, value) pairs, the last value of a repeated key wins
+        :return: None
+        """
+        batch = sorted(dict(items).items())
+        if not batch:
+            return
+        keys = [key for key, _ in batch]
+        values = [value for _, value in batch]
+        if self.is_small_against(len(keys)):
+            self.rebuild(keys, values)
+            return
+        stack = [(self.root, 0, len(keys))]
+        while stack:
+            node, lo, hi = stack.pop()
+            if hi - lo <= DESCENT_RUN:
+                for t in range(lo, hi):
+                    self.insert_below(node, keys[t], values[t])
+                continue
+            i = bisect_left(keys, node.key, lo, hi)
+            j = i
+            if i < hi and keys[i] == node.key:
+                node.value = values[i]
+                j = i + 1
+            if lo < i:
+                if node.left is None:
+                    node.left = self.link_sorted_nodes(
+                        [self.node_class(keys[t], values[t]) for t in range(lo, i)], 0, i - lo)
+                else:
+                    stack.append((node.left, lo, i))
+            if j < hi:
+                if node.right is None:
+                    node.right = self.link_sorted_nodes(
+                        [self.node_class(keys[t], values[t]) for t in range(j, hi)], 0, hi - j)
+                else:
+                    stack.append((node.right, j, hi))
+
+    def delete_many(self, keys):
+        """
+        Remove a batch of keys from the BST. Keys not in the BST are ignored.
+        The batch is sorted once and pushed down the tree together, as in insert_many.
+        A removed node with two sons is replaced by relinking its successor in its place.
+        Batches large compared to the tree are merged with it and rebuilt instead.
+        :param keys: iterable of keys
+        :return: number of keys deleted
+        """
+        keys = sorted(set(keys))
+        if not keys:
+            return 0
+        if self.is_small_against(len(keys)):
+            return self.rebuild(keys, delete=True)
+        removed = 0
+        # Each entry is a link (parent and side, parent None for the root) and the range of keys to remove below it.
+        # Entries are handled last in first out, so a link is used before anything above it is relinked.
+        stack = [(None, True, 0, len(keys))]
+        while stack:
+            parent, is_left, lo, hi = stack.pop()
+            node = self.root if parent is None else parent.left if is_left else parent.right
+            if node is None:
+                continue
+            i = bisect_left(keys, node.key, lo, hi)
+            if i == hi or keys[i] != node.key:
+                if i < hi:
+                    stack.append((node, False, i, hi))
+                if lo < i:
+                    stack.append((node, True, lo, i))
+                continue
+            removed += 1
+            if node.left is None or node.right is None:
+                replacement = node.left if node.left is not None else node.right
+            else:
+                successor_parent, replacement = node, node.right
+                while replacement.left is not None:
+                    successor_parent, replacement = replacement, replacement.left
+                if successor_parent is node:
+                    node.right = replacement.right
+                else:
+                    successor_parent.left = replacement.right
+                replacement.left, replacement.right = node.left, node.right
+            if parent is None:
+                self.root = replacement
+            elif is_left:
+                parent.left = replacement
+            else:
+                parent.right = replacement
+            node.left = node.right = None
+            if i + 1 < hi:
+                stack.append((parent, is_left, i + 1, hi))
+            if lo < i:
+                stack.append((parent, is_left, lo, i))
+        return removed
+
+    def save(self, path):
+        """
+        Write the (key, value) pairs of the tree to a file in inorder
+        :param path: file path
+        :return: None
+        """
+        keys, values = [], []
+        for key, value in self.iter_inorder(items=True):
+            keys.append(key)
+            values.append(value)
+        with open(path, 'wb') as f:
+            pickle.dump((keys, values), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Read a file written by save and link its pairs into a balanced tree in O(n)
+        :param path: file path
+        :return: an object of type cls holding the saved pairs
+        """
+        with open(path, 'rb') as f:
+            keys, values = pickle.load(f)
+        tree = cls()
+        nodes = [cls.node_class(key, value) for key, value in zip(keys, values)]
+        tree.root = tree.link_sorted_nodes(nodes, 0, len(nodes))
+        return tree
+
+    def save_mapped(self, path):
+        """
+        Write the tree in the flat sorted-array format read by MappedIndex
+        :param path: file path
+        :return: None
+        """
+        write_mapped_index(path, self.iter_inorder(items=True))
 
     @staticmethod
     def create_BST_from_sorted_arr(arr):
@@ -238,15 +625,16 @@ class BST:
         :param arr: sorted array as Python list
         :return: an object of type BST representing the balanced BST
         """
-        if len(arr) == 0:
-            return BST()
-        if len(arr) == 1:
-            return BST(Node(arr[0]))
-        root_id = len(arr) // 2
-        root = Node(arr[root_id])
-        root.left = BST.create_BST_from_sorted_arr(arr[:root_id]).root
-        root.right = BST.create_BST_from_sorted_arr(arr[root_id + 1:]).root
-        return BST(root)
+        def build(lo, hi):
+            if lo >= hi:
+                return None
+            root_id = (lo + hi) // 2
+            root = Node(arr[root_id])
+            root.left = build(lo, root_id)
+            root.right = build(root_id + 1, hi)
+            return root
+
+        return BST(build(0, len(arr)))
 
 
 # -------------------------------------------------------------------------------------------------------------------- #
@@ -256,6 +644,7 @@ class AVLNode(Node):
     """
     Node of AVL
     """
+    __slots__ = ('height', 'size')
 
     def __init__(self, key, value=None, left=None, right=None):
         """
@@ -267,9 +656,10 @@ class AVLNode(Node):
         """
         super(AVLNode, self).__init__(key, value, left, right)
         self.height = 0
+        self.size = 1
 
     def __repr__(self):
-        return super(AVLNode, self).__repr__() + ',' + 'height=' + str(self.height)
+        return super(AVLNode, self).__repr__() + ',' + 'height=' + str(self.height) + ',' + 'size=' + str(self.size)
 
     def get_balance(self):
         """
@@ -287,6 +677,7 @@ class AVL(BST):
     """
     AVL Data Structure
     """
+    node_class = AVLNode
 
     def __init__(self, root=None):
         """
@@ -295,6 +686,9 @@ class AVL(BST):
         """
         super(AVL, self).__init__(root)
 
+    def __len__(self):
+        return self.root.size if self.root is not None else 0
+
     def insert(self, key, value):
         """
         Inserts a new (key,value) pair to the BST.
@@ -303,47 +697,48 @@ class AVL(BST):
         :param key: int
         :return: None
         """
-        node = self.find(key)
-        if node:
-            node.value = value
-            return None
-        node_inserted = self.insert_node(key, value)
-        parent = self.find_parent(node_inserted.key)
-        while parent is not None:
-            self.updateHeight(parent)
-            if abs(parent.get_balance()) > 1:
-                self.reBalance(parent)
-            parent = self.find_parent(parent.key)
-
+        path = self.insert_node(key, value)
+        self.retrace(path)
 
     def leftRotation(self, node):
         """
-        Do a left rotation for a given node and updates the height accordingly
+        Do a left rotation for a given node by relinking it under its right son and updates heights and sizes.
+        No node is allocated and every node keeps its key, so references returned by find stay valid.
+        The caller is responsible for linking the returned node in place of the given one.
         :param node: Node
+        :return: the new root of the rotated subtree
         """
-        node.left = AVLNode(node.key, node.value, node.left, node.right.left)
-        self.updateHeight(node.left)
-        node.key = node.right.key
-        node.value = node.right.value
-        node.right = node.right.right
+        pivot = node.right
+        node.right = pivot.left
+        pivot.left = node
         self.updateHeight(node)
+        self.updateHeight(pivot)
+        pivot.size = node.size
+        self.updateSize(node)
+        return pivot
 
     def rightRotation(self, node):
         """
-        Do a right rotation for a given node and updates the height accordingly
+        Do a right rotation for a given node by relinking it under its left son and updates heights and sizes.
+        No node is allocated and every node keeps its key, so references returned by find stay valid.
+        The caller is responsible for linking the returned node in place of the given one.
         :param node: Node
+        :return: the new root of the rotated subtree
         """
-        node.right = AVLNode(node.key, node.value, node.left.right, node.right)
-        self.updateHeight(node.right)
-        node.key = node.left.key
-        node.value = node.left.value
-        node.left = node.left.left
+        pivot = node.left
+        node.left = pivot.right
+        pivot.right = node
         self.updateHeight(node)
+        self.updateHeight(pivot)
+        pivot.size = node.size
+        self.updateSize(node)
+        return pivot
 
     def reBalance(self, node):
         """
         Rebalance the Avl by choosing the right strategy for re-balancing
         :param node: Node
+        :return: the new root of the re-balanced subtree
         """
         h_left, h_right = -1, -1
         if node.left:
@@ -359,7 +754,7 @@ class AVL(BST):
             if child_node.right:
                 h_right = child_node.right.height
             if h_left < h_right:
-                self.leftRotation(child_node)
+                node.left = self.leftRotation(child_node)
             return self.rightRotation(node)
         else:
             child_node = node.right
@@ -369,9 +764,23 @@ class AVL(BST):
             if child_node.right:
                 h_right = child_node.right.height
             if h_left > h_right:
-                self.rightRotation(child_node)
+                node.right = self.rightRotation(child_node)
             return self.leftRotation(node)
 
+    def replace_child(self, parent, old, new):
+        """
+        Link new in the place old had under parent
+        :param parent: AVLNode or None if old is the root
+        :param old: AVLNode
+        :param new: AVLNode or None
+        """
+        if parent is None:
+            self.root = new
+        elif parent.left is old:
+            parent.left = new
+        else:
+            parent.right = new
+
     def updateHeight(self, node):
         """
         update the given node height
@@ -386,30 +795,150 @@ class AVL(BST):
             h_right = node.right.height
         node.height = max(h_left,  h_right) + 1
 
+    def updateSize(self, node):
+        """
+        update the given node subtree size
+        :param node: Node
+        """
+        if node is None:
+            return
+        size = 1
+        if node.left:
+            size += node.left.size
+        if node.right:
+            size += node.right.size
+        node.size = size
+
+    def retrace(self, path):
+        """
+        Walk back up the recorded ancestors of a changed node, updating heights, sizes and re-balancing.
+        Once a subtree keeps its previous height nothing above it can become unbalanced,
+        so only the sizes of the remaining ancestors are refreshed.
+        :param path: list of AVLNode from the root down to the parent of the changed node
+        """
+        top = self.retrace_nodes(path)
+        if path:
+            self.root = top
+
+    def retrace_nodes(self, path):
+        """
+        retrace for a path starting at the root of a subtree, which is left for the caller to link
+        :param path: list of AVLNode from the root of the subtree down to the parent of the changed node
+        :return: the new root of the subtree or None if path is empty
+        """
+        balanced = False
+        top = path[0] if path else None
+        for i in range(len(path) - 1, -1, -1):
+            node = path[i]
+            self.updateSize(node)
+            if balanced:
+                continue
+            old_height = node.height
+            self.updateHeight(node)
+            if abs(node.get_balance()) > 1:
+                new_node = self.reBalance(node)
+                if i:
+                    self.replace_child(path[i - 1], node, new_node)
+                else:
+                    top = new_node
+                node = new_node
+            if node.height == old_height:
+                balanced = True
+        return top
+
+    def rank(self, key):
+        """
+        key does not have to be in the AVL
+        :param key: int
+        :return: the number of keys in the AVL smaller than key
+        """
+        rank = 0
+        cur = self.root
+        while cur is not None:
+            if key > cur.key:
+                rank += 1 + (cur.left.size if cur.left else 0)
+                cur = cur.right
+            else:
+                cur = cur.left
+        return rank
+
+    def select(self, i):
+        """
+        :param i: int, 0 based position in sorted order
+        :return: the Node with the i-th smallest key or None if i is out of range
+        """
+        if i < 0 or i >= len(self):
+            return None
+        cur = self.root
+        while True:
+            left_size = cur.left.size if cur.left else 0
+            if i < left_size:
+                cur = cur.left
+            elif i > left_size:
+                i -= left_size + 1
+                cur = cur.right
+            else:
+                return cur
+
+    def count_range(self, lo=None, hi=None):
+        """
+        :param lo: int, inclusive lower bound or None for no lower bound
+        :param hi: int, exclusive upper bound or None for no upper bound
+        :return: the number of keys in [lo, hi)
+        """
+        count = len(self) if hi is None else self.rank(hi)
+        if lo is not None:
+            count -= self.rank(lo)
+        return max(count, 0)
+
+    def find_path(self, key, node=None):
+        """
+        Descend once from the root looking for key, recording the visited ancestors
+        :param key: int
+        :param node: AVLNode to start the descent at instead of the root
+        :return: (Node or None, list of the ancestors of that Node from the root down)
+        """
+        path = []
+        cur = self.root if node is None else node
+        while cur is not None:
+            if key > cur.key:
+                path.append(cur)
+                cur = cur.right
+            elif key < cur.key:
+                path.append(cur)
+                cur = cur.left
+            else:
+                break
+        return cur, path
+
     def insert_node(self, key, value):
         """
-        Inserts a new (key,value) pair to the AVL.
+        Inserts a new (key,value) pair to the AVL in a single descent.
+        In case key already exists in the AVL update the node's value
         :param value: anything
         :param key: int
-        :return AVLNode that was inserted
+        :return list of the ancestors of the inserted AVLNode from the root down (empty if nothing was inserted)
         """
+        path = []
         cur = self.root
         if cur is None:
             self.root = AVLNode(key, value)
-            return AVLNode(key, value)
-        while cur is not None:
+            return path
+        while True:
+            if cur.key == key:
+                cur.value = value
+                return []
+            path.append(cur)
             if cur.key > key:
                 if cur.left is None:
                     cur.left = AVLNode(key, value)
-                    return cur.left
-                else:
-                    cur = cur.left
+                    return path
+                cur = cur.left
             else:
                 if cur.right is None:
                     cur.right = AVLNode(key, value)
-                    return cur.right
-                else:
-                    cur = cur.right
+                    return path
+                cur = cur.right
 
     def delete(self, key):
         """
@@ -418,45 +947,1510 @@ class AVL(BST):
         :param key: int
         :return: OK if deleted successfully or NO_ITEM if key not in the BST
         """
-        node = self.find(key)
+        node, path = self.find_path(key)
         if node is None:
             return NO_ITEM
-        deleted_node_parent = self.delete_node(node)
-        while deleted_node_parent is not None:
-            self.updateHeight(deleted_node_parent)
-            if abs(deleted_node_parent.get_balance()) > 1:
-                self.reBalance(deleted_node_parent)
-            deleted_node_parent = self.find_parent(deleted_node_parent.key)
+        self.retrace(self.delete_node(node, path))
         return OK
 
-    def delete_node(self, node):
+    def delete_node(self, node, path=None):
         """
         Remove the given node from the AVL.
-        :param key: AVLNode
-        :return: The parent AVLNode of the deleted Node
+        A node with two sons is replaced by relinking its successor in its place, so no key is moved between nodes.
+        :param node: AVLNode
+        :param path: the ancestors of node from the root down, as returned by find_path
+        :return: list of the ancestors of the removed position from the root down
         """
+        if path is None:
+            path = self.find_path(node.key)[1]
+        parent = path[-1] if path else None
         if node.left is None or node.right is None:
-            node_to_delete = node
-        else:
-            if node.right.left is None:
-                node_to_delete = node.right
-            else:
-                node_to_delete = self.find_minimum(node.right)
-        parent = self.find_parent(node_to_delete.key)
+            node_child = node.left if node.left is not None else node.right
+            self.replace_child(parent, node, node_child)
+            return path
 
-        if node_to_delete.left is not None:
-            node_child = node_to_delete.left
-        else:
-            node_child = node_to_delete.right
-        if parent is None:
-            self.root = node_child
+        node_index = len(path)
+        path.append(node)
+        successor = node.right
+        while successor.left is not None:
+            path.append(successor)
+            successor = successor.left
+        self.replace_child(path[-1], successor, successor.right)
+        successor.left = node.left
+        successor.right = node.right
+        successor.height = node.height
+        successor.size = node.size
+        self.replace_child(parent, node, successor)
+        node.left = node.right = None
+        path[node_index] = successor
+        return path
+
+    @classmethod
+    def from_sorted(cls, keys, values=None):
+        """
+        Creates a balanced AVL from strictly increasing keys in O(n), without slicing the input.
+        :param keys: sorted sequence of keys
+        :param values: sequence of values matching keys, or None for all None values
+        :return: an AVL holding the given (key, value) pairs
+        """
+        if values is None:
+            nodes = [AVLNode(key) for key in keys]
         else:
-            if parent.left == node_to_delete:
-                parent.left = node_child
+            nodes = [AVLNode(key, value) for key, value in zip(keys, values)]
+        tree = cls()
+        tree.root = tree.link_sorted_nodes(nodes, 0, len(nodes))
+        return tree
+
+    def link_sorted_nodes(self, nodes, lo, hi):
+        """
+        Relink nodes[lo:hi], which are sorted by key, into a balanced subtree with heights and sizes
+        :param nodes: list of AVLNode
+        :return: the root of the subtree or None if the range is empty
+        """
+        node = super(AVL, self).link_sorted_nodes(nodes, lo, hi)
+        if node is not None:
+            self.updateHeight(node)
+            self.updateSize(node)
+        return node
+
+    def is_small_against(self, batch_size):
+        """
+        :param batch_size: int
+        :return: True if a batch of batch_size keys is large enough to rebuild the tree instead
+        """
+        return batch_size >= len(self) * BULK_REBUILD_RATIO
+
+    def insert_subtree(self, node, key, value):
+        """
+        Inserts a (key,value) pair into the non empty subtree rooted at node, or updates the value of key
+        :return: the new root of the subtree, which is left for the caller to link
+        """
+        path = []
+        cur = node
+        while cur.key != key:
+            path.append(cur)
+            if key < cur.key:
+                if cur.left is None:
+                    cur.left = AVLNode(key, value)
+                    return self.retrace_nodes(path)
+                cur = cur.left
             else:
-                parent.right = node_child
-        if node is not node_to_delete:
-            node.key = node_to_delete.key
-            node.value = node_to_delete.value
-        return parent
+                if cur.right is None:
+                    cur.right = AVLNode(key, value)
+                    return self.retrace_nodes(path)
+                cur = cur.right
+        cur.value = value
+        return node
+
+    def delete_subtree(self, node, key):
+        """
+        Remove key from the non empty subtree rooted at node
+        :return: (the new root of the subtree, which is left for the caller to link, number of keys removed)
+        """
+        target, path = self.find_path(key, node)
+        if target is None:
+            return node, 0
+        if not path:
+            return self.join_pair_nodes(target.left, target.right), 1
+        return self.retrace_nodes(self.delete_node(target, path)), 1
+
+    def set_value(self, node, value):
+        """
+        :param node: AVLNode
+        :param value: anything
+        :return: the node to link in place of node, holding value
+        """
+        node.value = value
+        return node
+
+    def join_pair_nodes(self, left, right):
+        """
+        Join two AVL subtrees, all keys in left smaller than the keys in right, by detaching the minimum of right
+        :return: the root of the joined subtree
+        """
+        if right is None:
+            return left
+        _, middle, right = self.split_nodes(right, self.find_minimum(right).key)
+        return self.join_nodes(left, middle, right)
+
+    def insert_sorted_nodes(self, node, keys, values, lo, hi):
+        """
+        Union the subtree rooted at node with the sorted batch keys[lo:hi] by splitting it around the middle key
+        of the batch and joining the recursive results, in O(m log(n/m + 1)) for m batch keys.
+        :return: the root of the resulting subtree
+        """
+        if lo >= hi:
+            return node
+        if node is None:
+            return self.link_sorted_nodes([AVLNode(keys[t], values[t]) for t in range(lo, hi)], 0, hi - lo)
+        if hi - lo == 1:
+            return self.insert_subtree(node, keys[lo], values[lo])
+        mid = (lo + hi) // 2
+        small, found, large = self.split_nodes(node, keys[mid])
+        if found is None:
+            found = AVLNode(keys[mid])
+        found.value = values[mid]
+        return self.join_nodes(self.insert_sorted_nodes(small, keys, values, lo, mid), found,
+                               self.insert_sorted_nodes(large, keys, values, mid + 1, hi))
+
+    def delete_sorted_nodes(self, node, keys, lo, hi):
+        """
+        Remove the sorted batch keys[lo:hi] from the subtree rooted at node by splitting and joining
+        :return: (the root of the resulting subtree, number of keys removed)
+        """
+        if lo >= hi or node is None:
+            return node, 0
+        if hi - lo == 1:
+            return self.delete_subtree(node, keys[lo])
+        mid = (lo + hi) // 2
+        small, found, large = self.split_nodes(node, keys[mid])
+        small, removed_small = self.delete_sorted_nodes(small, keys, lo, mid)
+        large, removed_large = self.delete_sorted_nodes(large, keys, mid + 1, hi)
+        removed = removed_small + removed_large + (found is not None)
+        return self.join_pair_nodes(small, large), removed
+
+    def insert_descent_nodes(self, node, keys, values, lo, hi):
+        """
+        Push the sorted batch keys[lo:hi] down the subtree rooted at node: each node splits the batch around its key,
+        so keys sharing a path share its descent, and the two sons are joined back under it.
+        A run of keys landing on the same empty spot becomes a balanced subtree and the last few keys
+        of a subtree (DESCENT_RUN) are inserted one at a time from its root.
+        :return: the root of the resulting subtree
+        """
+        if lo >= hi:
+            return node
+        if node is None:
+            return self.link_sorted_nodes([AVLNode(keys[t], values[t]) for t in range(lo, hi)], 0, hi - lo)
+        if hi - lo <= DESCENT_RUN:
+            for t in range(lo, hi):
+                node = self.insert_subtree(node, keys[t], values[t])
+            return node
+        i = j = bisect_left(keys, node.key, lo, hi)
+        if i < hi and keys[i] == node.key:
+            node = self.set_value(node, values[i])
+            j = i + 1
+        return self.join_nodes(self.insert_descent_nodes(node.left, keys, values, lo, i), node,
+                               self.insert_descent_nodes(node.right, keys, values, j, hi))
+
+    def delete_descent_nodes(self, node, keys, lo, hi):
+        """
+        Push the sorted batch keys[lo:hi] down the subtree rooted at node, as insert_descent_nodes does,
+        joining the sons of each removed node without it
+        :return: (the root of the resulting subtree, number of keys removed)
+        """
+        if lo >= hi or node is None:
+            return node, 0
+        if hi - lo <= DESCENT_RUN:
+            removed = 0
+            for t in range(lo, hi):
+                if node is None:
+                    break
+                node, removed_key = self.delete_subtree(node, keys[t])
+                removed += removed_key
+            return node, removed
+        i = bisect_left(keys, node.key, lo, hi)
+        found = i < hi and keys[i] == node.key
+        left, removed_left = self.delete_descent_nodes(node.left, keys, lo, i)
+        right, removed_right = self.delete_descent_nodes(node.right, keys, i + found, hi)
+        removed = removed_left + removed_right + found
+        if found:
+            return self.join_pair_nodes(left, right), removed
+        if not removed:
+            return node, 0
+        return self.join_nodes(left, node, right), removed
+
+    def merge_pays_off(self, keys):
+        """
+        Estimate whether merging the sorted batch with split/join beats pushing it down the tree.
+        A merge costs O(g log(n/g + 1)) for a batch filling g gaps between the keys of the tree, against
+        O(m log n) for the m keys of the batch, so it only pays off for batches clustered in few gaps.
+        g is estimated from the ranks of MERGE_SAMPLES evenly spaced keys of the batch.
+        :param keys: sorted list of distinct keys
+        :return: True if the batch should be merged with split/join
+        """
+        n, m = len(self), len(keys)
+        if m < MERGE_SAMPLES or n == 0:
+            return False
+        gaps = 0
+        last_index, last_rank = 0, self.rank(keys[0])
+        for t in range(1, MERGE_SAMPLES):
+            index = t * (m - 1) // (MERGE_SAMPLES - 1)
+            rank = self.rank(keys[index])
+            gaps += min(index - last_index, rank - last_rank + 1)
+            last_index, last_rank = index, rank
+        gaps = max(gaps, 1)
+        return MERGE_COST * gaps * math.log2(n / gaps + 1) < m * math.log2(n + 1)
+
+    def insert_many(self, items):
+        """
+        Inserts a batch of (key,value) pairs, updating the values of existing keys.
+        The batch is sorted once and pushed down the AVL together (see insert_descent_nodes),
+        or merged into it with split/join if the batch is clustered enough for that to pay off (see merge_pays_off).
+        Batches large compared to the AVL are merged with it and rebuilt instead.
+        :param items: iterable of (key, value) pairs, the last value of a repeated key wins
+        :return: None
+        """
+        batch = sorted(dict(items).items())
+        if not batch:
+            return
+        keys = [key for key, _ in batch]
+        values = [value for _, value in batch]
+        if self.is_small_against(len(keys)):
+            self.rebuild(keys, values)
+        elif self.merge_pays_off(keys):
+            self.root = self.insert_sorted_nodes(self.root, keys, values, 0, len(keys))
+        else:
+            self.root = self.insert_descent_nodes(self.root, keys, values, 0, len(keys))
+
+    def delete_many(self, keys):
+        """
+        Remove a batch of keys from the AVL. Keys not in the AVL are ignored.
+        The batch is pushed down the AVL or merged with split/join as in insert_many.
+        Batches large compared to the AVL are merged with it and rebuilt instead.
+        :param keys: iterable of keys
+        :return: number of keys deleted
+        """
+        keys = sorted(set(keys))
+        if not keys:
+            return 0
+        if self.is_small_against(len(keys)):
+            return self.rebuild(keys, delete=True)
+        if self.merge_pays_off(keys):
+            self.root, removed = self.delete_sorted_nodes(self.root, keys, 0, len(keys))
+        else:
+            self.root, removed = self.delete_descent_nodes(self.root, keys, 0, len(keys))
+        return removed
+
+    def join_nodes(self, left, node, right):
+        """
+        Join two AVL subtrees and a middle node into one AVL subtree in O(|height(left) - height(right)|).
+        All keys in left must be smaller than node.key and all keys in right larger.
+        :param left: AVLNode or None
+        :param node: detached AVLNode
+        :param right: AVLNode or None
+        :return: the root of the joined subtree
+        """
+        h_left = left.height if left else -1
+        h_right = right.height if right else -1
+        if h_left > h_right + 1:
+            left.right = self.join_nodes(left.right, node, right)
+            subtree = left
+        elif h_right > h_left + 1:
+            right.left = self.join_nodes(left, node, right.left)
+            subtree = right
+        else:
+            # Heights within one of each other, so node is balanced
+            node.left, node.right = left, right
+            node.height = max(h_left, h_right) + 1
+            node.size = 1 + (left.size if left else 0) + (right.size if right else 0)
+            return node
+        self.updateHeight(subtree)
+        self.updateSize(subtree)
+        if abs(subtree.get_balance()) > 1:
+            return self.reBalance(subtree)
+        return subtree
+
+    def split_nodes(self, node, key):
+        """
+        Split the AVL subtree rooted at node around key in O(log n)
+        :param node: AVLNode or None
+        :param key: int
+        :return: (root of the keys < key, detached Node with key or None, root of the keys > key)
+        """
+        if node is None:
+            return None, None, None
+        left, right = node.left, node.right
+        if key < node.key:
+            small, found, large = self.split_nodes(left, key)
+            return small, found, self.join_nodes(large, node, right)
+        if key > node.key:
+            small, found, large = self.split_nodes(right, key)
+            return self.join_nodes(left, node, small), found, large
+        node.left = node.right = None
+        node.height, node.size = 0, 1
+        return left, node, right
+
+    def join(self, other):
+        """
+        Move all keys of other into self in O(log n). other is left empty.
+        :param other: AVL whose keys are all larger than the keys of self
+        :return: None
+        """
+        if other.root is None:
+            return
+        if self.root is None:
+            self.root, other.root = other.root, None
+            return
+        if self.max().key >= other.min().key:
+            raise ValueError('all keys of the joined AVL must be larger than the keys of self')
+        _, middle, rest = self.split_nodes(other.root, other.min().key)
+        self.root = self.join_nodes(self.root, middle, rest)
+        other.root = None
+
+    def split(self, key):
+        """
+        Split the AVL into the keys smaller than key and the rest in O(log n). self is left empty.
+        :param key: int
+        :return: (AVL of the keys < key, AVL of the keys >= key)
+        """
+        small, found, large = self.split_nodes(self.root, key)
+        if found is not None:
+            large = self.join_nodes(None, found, large)
+        self.root = None
+        return type(self)(small), type(self)(large)
+
+
+class PersistentAVL(AVL):
+    """
+    AVL whose updates never modify a node that is already in the tree.
+    insert/delete copy the nodes on the search path (and the nodes rotations touch) and publish the new root
+    with a single assignment, so each version shares all but O(log n) nodes with the previous one.
+    A snapshot can be read from other threads without locking while one writer keeps updating.
+    Nodes reachable from the tree, including the ones returned by find, are shared by all the versions and
+    must be treated as read-only: assigning node.value changes the value in every version holding that node.
+    Use insert to change a value in a new version only.
+    """
+
+    def copy_node(self, node):
+        """
+        :param node: AVLNode
+        :return: a new AVLNode with the same key, value, sons, height and size
+        """
+        new_node = AVLNode(node.key, node.value, node.left, node.right)
+        new_node.height = node.height
+        new_node.size = node.size
+        return new_node
+
+    def snapshot(self):
+        """
+        :return: a PersistentAVL over the current version, which no later update of self will change.
+        Updates of the snapshot copy the nodes they touch too, so they never change self.
+        """
+        return PersistentAVL(self.root)
+
+    def leftRotation(self, node):
+        """
+        Do a left rotation on copies of node and its right son
+        :param node: AVLNode
+        :return: the new root of the rotated subtree
+        """
+        node = self.copy_node(node)
+        node.right = self.copy_node(node.right)
+        return super(PersistentAVL, self).leftRotation(node)
+
+    def rightRotation(self, node):
+        """
+        Do a right rotation on copies of node and its left son
+        :param node: AVLNode
+        :return: the new root of the rotated subtree
+        """
+        node = self.copy_node(node)
+        node.left = self.copy_node(node.left)
+        return super(PersistentAVL, self).rightRotation(node)
+
+    def fix_node(self, node):
+        """
+        Update the height and size of a freshly copied node and re-balance it
+        :param node: AVLNode not shared with any version
+        :return: the root of the re-balanced subtree
+        """
+        self.updateHeight(node)
+        self.updateSize(node)
+        if abs(node.get_balance()) > 1:
+            return self.reBalance(node)
+        return node
+
+    def insert_nodes(self, node, key, value):
+        """
+        Path copying insert into the subtree rooted at node
+        :return: the root of the new version of the subtree
+        """
+        if node is None:
+            return AVLNode(key, value)
+        node = self.copy_node(node)
+        if key < node.key:
+            node.left = self.insert_nodes(node.left, key, value)
+        elif key > node.key:
+            node.right = self.insert_nodes(node.right, key, value)
+        else:
+            node.value = value
+            return node
+        return self.fix_node(node)
+
+    def delete_min_nodes(self, node):
+        """
+        Path copying removal of the minimum of the non empty subtree rooted at node
+        :return: (the root of the new version of the subtree, the removed AVLNode)
+        """
+        if node.left is None:
+            return node.right, node
+        left, minimum = self.delete_min_nodes(node.left)
+        node = self.copy_node(node)
+        node.left = left
+        return self.fix_node(node), minimum
+
+    def delete_nodes(self, node, key):
+        """
+        Path copying delete from the subtree rooted at node
+        :return: (the root of the new version of the subtree, True if key was removed)
+        """
+        if node is None:
+            return None, False
+        if key < node.key:
+            left, removed = self.delete_nodes(node.left, key)
+            if not removed:
+                return node, False
+            node = self.copy_node(node)
+            node.left = left
+        elif key > node.key:
+            right, removed = self.delete_nodes(node.right, key)
+            if not removed:
+                return node, False
+            node = self.copy_node(node)
+            node.right = right
+        else:
+            if node.left is None:
+                return node.right, True
+            if node.right is None:
+                return node.left, True
+            right, successor = self.delete_min_nodes(node.right)
+            successor = self.copy_node(successor)
+            successor.left, successor.right = node.left, right
+            node = successor
+        return self.fix_node(node), True
+
+    def insert_subtree(self, node, key, value):
+        """
+        insert_subtree of AVL by path copying
+        """
+        return self.insert_nodes(node, key, value)
+
+    def delete_subtree(self, node, key):
+        """
+        delete_subtree of AVL by path copying
+        """
+        node, removed = self.delete_nodes(node, key)
+        return node, int(removed)
+
+    def set_value(self, node, value):
+        """
+        set_value of AVL on a copy of node
+        """
+        node = self.copy_node(node)
+        node.value = value
+        return node
+
+    def insert(self, key, value):
+        """
+        Inserts a new (key,value) pair, or updates the value of key, in a new version of the AVL
+        :param key: int
+        :param value: anything
+        :return: the root of the new version
+        """
+        self.root = self.insert_nodes(self.root, key, value)
+        return self.root
+
+    def delete(self, key):
+        """
+        Remove the node associated with key in a new version of the AVL.
+        If key not in AVL don't do anything.
+        :param key: int
+        :return: OK if deleted successfully or NO_ITEM if key not in the AVL
+        """
+        root, removed = self.delete_nodes(self.root, key)
+        if not removed:
+            return NO_ITEM
+        self.root = root
+        return OK
+
+    def join_nodes(self, left, node, right):
+        """
+        join_nodes of AVL on copies of the nodes it relinks
+        """
+        h_left = left.height if left else -1
+        h_right = right.height if right else -1
+        if h_left > h_right + 1:
+            left = self.copy_node(left)
+        elif h_right > h_left + 1:
+            right = self.copy_node(right)
+        else:
+            node = self.copy_node(node)
+        return super(PersistentAVL, self).join_nodes(left, node, right)
+
+    def split_nodes(self, node, key):
+        """
+        split_nodes of AVL, detaching a copy of the node holding key
+        """
+        if node is not None and key == node.key:
+            node = self.copy_node(node)
+        return super(PersistentAVL, self).split_nodes(node, key)
+
+    def is_small_against(self, batch_size):
+        """
+        Never rebuild, since rebuilding relinks the existing nodes in place
+        """
+        return False
+
+
+# -------------------------------------------------------------------------------------------------------------------- #
+
+
+class ArrayNodeStore:
+    """
+    Struct-of-arrays storage for AVL nodes.
+    Node i is described by keys[i], values[i], left[i], right[i] and height[i]; a missing son is NIL.
+    Freed slots are chained through the left array and reused before the buffers grow.
+    """
+
+    NIL = -1
+
+    def __init__(self, capacity=16):
+        """
+        Constructor for the node store
+        :param capacity: number of node slots to preallocate
+        """
+        capacity = max(capacity, 1)
+        self.keys = array('q', bytes(8 * capacity))
+        self.values = [None] * capacity
+        self.left = array('i', [self.NIL]) * capacity
+        self.right = array('i', [self.NIL]) * capacity
+        self.height = array('b', bytes(capacity))
+        self.capacity = capacity
+        self.used = 0
+        self.free = self.NIL
+
+    def __len__(self):
+        return self.used
+
+    def allocate(self, key, value):
+        """
+        Take a free slot (growing the buffers if needed) and store a new leaf in it
+        :param key: int
+        :param value: anything
+        :return: index of the new node
+        """
+        if self.free != self.NIL:
+            i = self.free
+            self.free = self.left[i]
+        else:
+            if self.used == self.capacity:
+                self.grow()
+            i = self.used
+        self.used += 1
+        self.keys[i] = key
+        self.values[i] = value
+        self.left[i] = self.NIL
+        self.right[i] = self.NIL
+        self.height[i] = 0
+        return i
+
+    def release(self, i):
+        """
+        Return slot i to the free list
+        :param i: index of a node that is no longer linked in the tree
+        """
+        self.values[i] = None
+        self.left[i] = self.free
+        self.free = i
+        self.used -= 1
+
+    def grow(self):
+        """
+        Double the capacity of every buffer
+        """
+        extra = self.capacity
+        self.keys.extend(array('q', bytes(8 * extra)))
+        self.values.extend([None] * extra)
+        self.left.extend(array('i', [self.NIL]) * extra)
+        self.right.extend(array('i', [self.NIL]) * extra)
+        self.height.extend(array('b', bytes(extra)))
+        self.capacity += extra
+
+
+class ArrayNode:
+    """
+    View of one node of an ArrayAVL, as returned by ArrayAVL.find.
+    The view is only valid until the key it points to is deleted.
+    """
+    __slots__ = ('store', 'index')
+
+    def __init__(self, store, index):
+        self.store = store
+        self.index = index
+
+    @property
+    def key(self):
+        return self.store.keys[self.index]
+
+    @property
+    def value(self):
+        return self.store.values[self.index]
+
+    @value.setter
+    def value(self, value):
+        self.store.values[self.index] = value
+
+    def __repr__(self):
+        return 'Node: key,value=(' + str(self.key) + ',' + str(self.value) + ')'
+
+
+class ArrayAVL:
+    """
+    AVL Data Structure on top of an ArrayNodeStore instead of Node objects.
+    Keys must fit in a signed 64 bit integer. Offers the insert/delete/find/traversal API of AVL.
+    """
+
+    def __init__(self, capacity=16):
+        """
+        Constructor for a new array backed AVL
+        :param capacity: number of node slots to preallocate
+        """
+        self.store = ArrayNodeStore(capacity)
+        self.root = ArrayNodeStore.NIL
+
+    def __len__(self):
+        return len(self.store)
+
+    def height_of(self, i):
+        return self.store.height[i] if i != ArrayNodeStore.NIL else -1
+
+    def updateHeight(self, i):
+        """
+        update the height of node i
+        :param i: node index
+        """
+        store = self.store
+        store.height[i] = max(self.height_of(store.left[i]), self.height_of(store.right[i])) + 1
+
+    def get_balance(self, i):
+        """
+        :return: The balance of the tree rooted at node i
+        """
+        return self.height_of(self.store.left[i]) - self.height_of(self.store.right[i])
+
+    def leftRotation(self, i):
+        """
+        Do a left rotation for node i and updates the heights accordingly
+        :param i: node index
+        :return: index of the new root of the rotated subtree
+        """
+        store = self.store
+        pivot = store.right[i]
+        store.right[i] = store.left[pivot]
+        store.left[pivot] = i
+        self.updateHeight(i)
+        self.updateHeight(pivot)
+        return pivot
+
+    def rightRotation(self, i):
+        """
+        Do a right rotation for node i and updates the heights accordingly
+        :param i: node index
+        :return: index of the new root of the rotated subtree
+        """
+        store = self.store
+        pivot = store.left[i]
+        store.left[i] = store.right[pivot]
+        store.right[pivot] = i
+        self.updateHeight(i)
+        self.updateHeight(pivot)
+        return pivot
+
+    def reBalance(self, i):
+        """
+        Rebalance the subtree rooted at node i
+        :param i: node index
+        :return: index of the new root of the re-balanced subtree
+        """
+        store = self.store
+        if self.get_balance(i) > 0:
+            if self.get_balance(store.left[i]) < 0:
+                store.left[i] = self.leftRotation(store.left[i])
+            return self.rightRotation(i)
+        if self.get_balance(store.right[i]) > 0:
+            store.right[i] = self.rightRotation(store.right[i])
+        return self.leftRotation(i)
+
+    def replace_child(self, parent, old, new):
+        """
+        Link node new in the place node old had under parent
+        """
+        if parent == ArrayNodeStore.NIL:
+            self.root = new
+        elif self.store.left[parent] == old:
+            self.store.left[parent] = new
+        else:
+            self.store.right[parent] = new
+
+    def retrace(self, path):
+        """
+        Walk back up the recorded ancestors of a changed node, updating heights and re-balancing.
+        :param path: list of node indices from the root down to the parent of the changed node
+        """
+        height = self.store.height
+        for j in range(len(path) - 1, -1, -1):
+            i = path[j]
+            old_height = height[i]
+            self.updateHeight(i)
+            if abs(self.get_balance(i)) > 1:
+                new_i = self.reBalance(i)
+                self.replace_child(path[j - 1] if j else ArrayNodeStore.NIL, i, new_i)
+                i = new_i
+            if height[i] == old_height:
+                break
+
+    def find_path(self, key):
+        """
+        Descend once from the root looking for key, recording the visited ancestors
+        :param key: int
+        :return: (node index or NIL, list of the ancestors of that node from the root down)
+        """
+        store = self.store
+        keys, left, right = store.keys, store.left, store.right
+        path = []
+        i = self.root
+        while i != ArrayNodeStore.NIL:
+            cur_key = keys[i]
+            if key > cur_key:
+                path.append(i)
+                i = right[i]
+            elif key < cur_key:
+                path.append(i)
+                i = left[i]
+            else:
+                break
+        return i, path
+
+    def find(self, key):
+        """
+        If key is in the AVL find the node associated with key
+        otherwise return None
+        :param key: int
+        :return: ArrayNode if key is in AVL or None o.w.
+        """
+        store = self.store
+        keys, left, right = store.keys, store.left, store.right
+        i = self.root
+        while i != ArrayNodeStore.NIL:
+            cur_key = keys[i]
+            if key > cur_key:
+                i = right[i]
+            elif key < cur_key:
+                i = left[i]
+            else:
+                return ArrayNode(store, i)
+        return None
+
+    def insert(self, key, value):
+        """
+        Inserts a new (key,value) pair to the AVL.
+        In case key already exists in the AVL update the node's value
+        :param key: int
+        :param value: anything
+        :return: None
+        """
+        i, path = self.find_path(key)
+        if i != ArrayNodeStore.NIL:
+            self.store.values[i] = value
+            return
+        new_i = self.store.allocate(key, value)
+        if path:
+            parent = path[-1]
+            if key < self.store.keys[parent]:
+                self.store.left[parent] = new_i
+            else:
+                self.store.right[parent] = new_i
+        else:
+            self.root = new_i
+        self.retrace(path)
+
+    def delete(self, key):
+        """
+        Remove the node associated with key from the AVL.
+        If key not in AVL don't do anything.
+        :param key: int
+        :return: OK if deleted successfully or NO_ITEM if key not in the AVL
+        """
+        i, path = self.find_path(key)
+        if i == ArrayNodeStore.NIL:
+            return NO_ITEM
+        store = self.store
+        parent = path[-1] if path else ArrayNodeStore.NIL
+        if store.left[i] == ArrayNodeStore.NIL or store.right[i] == ArrayNodeStore.NIL:
+            child = store.left[i] if store.left[i] != ArrayNodeStore.NIL else store.right[i]
+            self.replace_child(parent, i, child)
+        else:
+            node_index = len(path)
+            path.append(i)
+            successor = store.right[i]
+            while store.left[successor] != ArrayNodeStore.NIL:
+                path.append(successor)
+                successor = store.left[successor]
+            self.replace_child(path[-1], successor, store.right[successor])
+            store.left[successor] = store.left[i]
+            store.right[successor] = store.right[i]
+            store.height[successor] = store.height[i]
+            self.replace_child(parent, i, successor)
+            path[node_index] = successor
+        store.release(i)
+        self.retrace(path)
+        return OK
+
+    def __iter__(self):
+        return self.iter_inorder()
+
+    def iter_inorder(self, items=False):
+        """
+        Lazily walk the AVL in inorder using an explicit stack of at most height nodes
+        :param items: yield (key, value) pairs instead of keys
+        :return: generator of keys in sorted order
+        """
+        store = self.store
+        stack = []
+        i = self.root
+        while stack or i != ArrayNodeStore.NIL:
+            while i != ArrayNodeStore.NIL:
+                stack.append(i)
+                i = store.left[i]
+            i = stack.pop()
+            yield (store.keys[i], store.values[i]) if items else store.keys[i]
+            i = store.right[i]
+
+    def iter_preorder(self, items=False):
+        """
+        Lazily walk the AVL in preorder using an explicit stack
+        :param items: yield (key, value) pairs instead of keys
+        :return: generator of keys in preorder
+        """
+        store = self.store
+        stack = [self.root] if self.root != ArrayNodeStore.NIL else []
+        while stack:
+            i = stack.pop()
+            yield (store.keys[i], store.values[i]) if items else store.keys[i]
+            if store.right[i] != ArrayNodeStore.NIL:
+                stack.append(store.right[i])
+            if store.left[i] != ArrayNodeStore.NIL:
+                stack.append(store.left[i])
+
+    def iter_postorder(self, items=False):
+        """
+        Lazily walk the AVL in postorder using an explicit stack of at most height nodes
+        :param items: yield (key, value) pairs instead of keys
+        :return: generator of keys in postorder
+        """
+        store = self.store
+        stack = []
+        last = ArrayNodeStore.NIL
+        i = self.root
+        while stack or i != ArrayNodeStore.NIL:
+            if i != ArrayNodeStore.NIL:
+                stack.append(i)
+                i = store.left[i]
+                continue
+            top = stack[-1]
+            if store.right[top] != ArrayNodeStore.NIL and store.right[top] != last:
+                i = store.right[top]
+            else:
+                yield (store.keys[top], store.values[top]) if items else store.keys[top]
+                last = stack.pop()
+
+    def inorder_traversal(self):
+        """
+        :return: an array (Python list) of keys sorted according to the inorder traversal of self
+        """
+        return list(self.iter_inorder())
+
+    def preorder_traversal(self):
+        """
+        :return: an array (Python list) of keys sorted according to the preorder traversal of self
+        """
+        return list(self.iter_preorder())
+
+    def postorder_traversal(self):
+        """
+        :return: an array (Python list) of keys sorted according to the postorder traversal of self
+        """
+        return list(self.iter_postorder())
+
+
+# -------------------------------------------------------------------------------------------------------------------- #
+
+
+class BPlusLeaf:
+    """
+    Leaf of a BPlusTree: sorted keys with the matching Nodes, chained to the next leaf for scans
+    """
+    __slots__ = ('keys', 'nodes', 'next')
+
+    def __init__(self, keys=None, nodes=None, next=None):
+        self.keys = keys if keys is not None else []
+        self.nodes = nodes if nodes is not None else []
+        self.next = next
+
+
+class BPlusInternal:
+    """
+    Internal node of a BPlusTree: children[i] holds the keys in [keys[i - 1], keys[i])
+    """
+    __slots__ = ('keys', 'children')
+
+    def __init__(self, keys, children):
+        self.keys = keys
+        self.children = children
+
+
+class BPlusTree:
+    """
+    B+-tree ordered map with the insert/delete/find/traversal contract of BST and AVL.
+    Every node holds up to order keys in a Python list searched with bisect, so a lookup touches
+    O(log_order n) nodes instead of O(log n). Records are kept as Node objects in the leaves,
+    so find returns a Node whose value can be updated in place.
+    """
+
+    def __init__(self, order=64):
+        """
+        Constructor for a new B+-tree
+        :param order: maximum number of keys in a node, at least 3
+        """
+        self.order = max(order, 3)
+        self.root = BPlusLeaf()
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def find_leaf(self, key):
+        """
+        :param key: int
+        :return: (the leaf that should hold key, list of (internal node, child index) from the root down)
+        """
+        path = []
+        cur = self.root
+        while isinstance(cur, BPlusInternal):
+            i = bisect_right(cur.keys, key)
+            path.append((cur, i))
+            cur = cur.children[i]
+        return cur, path
+
+    def find(self, key):
+        """
+        If key is in the tree find the Node associated with key
+        otherwise return None
+        :param key: int
+        :return: Node if key is in the tree or None o.w.
+        """
+        cur = self.root
+        while isinstance(cur, BPlusInternal):
+            cur = cur.children[bisect_right(cur.keys, key)]
+        i = bisect_left(cur.keys, key)
+        if i < len(cur.keys) and cur.keys[i] == key:
+            return cur.nodes[i]
+        return None
+
+    def insert(self, key, value):
+        """
+        Inserts a new (key,value) pair to the tree.
+        In case key already exists in the tree update the node's value
+        :param key: int
+        :param value: anything
+        :return: None
+        """
+        leaf, path = self.find_leaf(key)
+        i = bisect_left(leaf.keys, key)
+        if i < len(leaf.keys) and leaf.keys[i] == key:
+            leaf.nodes[i].value = value
+            return
+        leaf.keys.insert(i, key)
+        leaf.nodes.insert(i, Node(key, value))
+        self.count += 1
+        if len(leaf.keys) <= self.order:
+            return
+        mid = len(leaf.keys) // 2
+        right = BPlusLeaf(leaf.keys[mid:], leaf.nodes[mid:], leaf.next)
+        del leaf.keys[mid:], leaf.nodes[mid:]
+        leaf.next = right
+        separator, new_child = right.keys[0], right
+        while path:
+            parent, i = path.pop()
+            parent.keys.insert(i, separator)
+            parent.children.insert(i + 1, new_child)
+            if len(parent.keys) <= self.order:
+                return
+            mid = len(parent.keys) // 2
+            separator = parent.keys[mid]
+            new_child = BPlusInternal(parent.keys[mid + 1:], parent.children[mid + 1:])
+            del parent.keys[mid:], parent.children[mid + 1:]
+        self.root = BPlusInternal([separator], [self.root, new_child])
+
+    def delete(self, key):
+        """
+        Remove the node associated with key from the tree.
+        If key not in the tree don't do anything.
+        :param key: int
+        :return: OK if deleted successfully or NO_ITEM if key not in the tree
+        """
+        leaf, path = self.find_leaf(key)
+        i = bisect_left(leaf.keys, key)
+        if i == len(leaf.keys) or leaf.keys[i] != key:
+            return NO_ITEM
+        del leaf.keys[i], leaf.nodes[i]
+        self.count -= 1
+        minimum = self.order // 2
+        node = leaf
+        while path and len(node.keys) < minimum:
+            parent, i = path.pop()
+            if isinstance(node, BPlusLeaf):
+                self.fix_leaf(parent, i, minimum)
+            else:
+                self.fix_internal(parent, i, minimum)
+            node = parent
+        if isinstance(self.root, BPlusInternal) and not self.root.keys:
+            self.root = self.root.children[0]
+        return OK
+
+    def fix_leaf(self, parent, i, minimum):
+        """
+        Refill the under-full leaf parent.children[i] by borrowing from or merging with a sibling
+        """
+        leaf = parent.children[i]
+        left = parent.children[i - 1] if i > 0 else None
+        right = parent.children[i + 1] if i + 1 < len(parent.children) else None
+        if left is not None and len(left.keys) > minimum:
+            leaf.keys.insert(0, left.keys.pop())
+            leaf.nodes.insert(0, left.nodes.pop())
+            parent.keys[i - 1] = leaf.keys[0]
+        elif right is not None and len(right.keys) > minimum:
+            leaf.keys.append(right.keys.pop(0))
+            leaf.nodes.append(right.nodes.pop(0))
+            parent.keys[i] = right.keys[0]
+        elif left is not None:
+            left.keys += leaf.keys
+            left.nodes += leaf.nodes
+            left.next = leaf.next
+            del parent.keys[i - 1], parent.children[i]
+        else:
+            leaf.keys += right.keys
+            leaf.nodes += right.nodes
+            leaf.next = right.next
+            del parent.keys[i], parent.children[i + 1]
+
+    def fix_internal(self, parent, i, minimum):
+        """
+        Refill the under-full internal node parent.children[i] by borrowing from or merging with a sibling
+        """
+        node = parent.children[i]
+        left = parent.children[i - 1] if i > 0 else None
+        right = parent.children[i + 1] if i + 1 < len(parent.children) else None
+        if left is not None and len(left.keys) > minimum:
+            node.keys.insert(0, parent.keys[i - 1])
+            node.children.insert(0, left.children.pop())
+            parent.keys[i - 1] = left.keys.pop()
+        elif right is not None and len(right.keys) > minimum:
+            node.keys.append(parent.keys[i])
+            node.children.append(right.children.pop(0))
+            parent.keys[i] = right.keys.pop(0)
+        elif left is not None:
+            left.keys += [parent.keys[i - 1]] + node.keys
+            left.children += node.children
+            del parent.keys[i - 1], parent.children[i]
+        else:
+            node.keys += [parent.keys[i]] + right.keys
+            node.children += right.children
+            del parent.keys[i], parent.children[i + 1]
+
+    def first_leaf(self):
+        cur = self.root
+        while isinstance(cur, BPlusInternal):
+            cur = cur.children[0]
+        return cur
+
+    def __iter__(self):
+        return self.iter_inorder()
+
+    def iter_inorder(self, items=False):
+        """
+        Lazily walk the keys in sorted order along the leaf chain
+        :param items: yield (key, value) pairs instead of keys
+        :return: generator of keys in sorted order
+        """
+        leaf = self.first_leaf()
+        while leaf is not None:
+            if items:
+                for node in leaf.nodes:
+                    yield node.key, node.value
+            else:
+                yield from leaf.keys
+            leaf = leaf.next
+
+    def range(self, lo=None, hi=None, items=False):
+        """
+        Lazily walk the keys in [lo, hi) in sorted order
+        :param lo: int, inclusive lower bound or None for no lower bound
+        :param hi: int, exclusive upper bound or None for no upper bound
+        :param items: yield (key, value) pairs instead of keys
+        :return: generator of keys in sorted order
+        """
+        if lo is None:
+            leaf, i = self.first_leaf(), 0
+        else:
+            leaf = self.find_leaf(lo)[0]
+            i = bisect_left(leaf.keys, lo)
+        while leaf is not None:
+            for node in leaf.nodes[i:]:
+                if hi is not None and node.key >= hi:
+                    return
+                yield (node.key, node.value) if items else node.key
+            leaf, i = leaf.next, 0
+
+    def inorder_traversal(self):
+        """
+        :return: an array (Python list) of keys sorted according to the inorder traversal of self
+        """
+        return list(self.iter_inorder())
+
+
+# -------------------------------------------------------------------------------------------------------------------- #
+
+
+MAPPED_MAGIC = b'BSTIDX01'
+MAPPED_HEADER = struct.Struct('=8sq')
+
+
+def write_mapped_index(path, items):
+    """
+    Write (key, value) pairs with increasing int keys in the flat format read by MappedIndex:
+    a header with the number of keys, the keys as native int64, n + 1 int64 offsets of the values
+    and the pickled values one after the other.
+    :param path: file path
+    :param items: iterable of (key, value) pairs sorted by key
+    :return: None
+    """
+    keys = array('q')
+    values = []
+    for key, value in items:
+        keys.append(key)
+        values.append(value)
+    n = len(keys)
+    offsets = array('q', bytes(8 * (n + 1)))
+    with open(path, 'wb') as f:
+        f.write(MAPPED_HEADER.pack(MAPPED_MAGIC, n))
+        keys.tofile(f)
+        offsets_position = f.tell()
+        offsets.tofile(f)
+        offsets[0] = f.tell()
+        for i, value in enumerate(values):
+            f.write(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+            offsets[i + 1] = f.tell()
+        f.seek(offsets_position)
+        offsets.tofile(f)
+
+
+class MappedIndex:
+    """
+    Read-only sorted index served straight from a memory-mapped file written by write_mapped_index.
+    Opening costs O(1) whatever the number of keys; find and range binary-search the mapped keys
+    and only unpickle the values they return.
+    """
+
+    def __init__(self, path):
+        """
+        Map an index file
+        :param path: file path
+        """
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, n = MAPPED_HEADER.unpack_from(self.map)
+        if magic != MAPPED_MAGIC:
+            self.map.close()
+            raise ValueError('not a mapped index file: ' + str(path))
+        self.view = memoryview(self.map)
+        start = MAPPED_HEADER.size
+        self.keys = self.view[start:start + 8 * n].cast('q')
+        self.offsets = self.view[start + 8 * n:start + 8 * (2 * n + 1)].cast('q')
+
+    def close(self):
+        """
+        Release the mapping
+        """
+        self.keys.release()
+        self.offsets.release()
+        self.view.release()
+        self.map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def value_at(self, i):
+        """
+        :param i: position of a key
+        :return: the value stored for the i-th key
+        """
+        return pickle.loads(self.map[self.offsets[i]:self.offsets[i + 1]])
+
+    def find(self, key):
+        """
+        If key is in the index find the Node associated with key
+        otherwise return None
+        :param key: int
+        :return: a Node holding a copy of the stored value if key is in the index or None o.w.
+        """
+        i = bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            return Node(key, self.value_at(i))
+        return None
+
+    def range(self, lo=None, hi=None, items=False):
+        """
+        Lazily walk the keys in [lo, hi) in sorted order
+        :param lo: int, inclusive lower bound or None for no lower bound
+        :param hi: int, exclusive upper bound or None for no upper bound
+        :param items: yield (key, value) pairs instead of keys
+        :return: generator of keys in sorted order
+        """
+        start = 0 if lo is None else bisect_left(self.keys, lo)
+        stop = len(self.keys) if hi is None else bisect_left(self.keys, hi)
+        for i in range(start, stop):
+            yield (self.keys[i], self.value_at(i)) if items else self.keys[i]
+
+    def __iter__(self):
+        return self.iter_inorder()
+
+    def iter_inorder(self, items=False):
+        """
+        :param items: yield (key, value) pairs instead of keys
+        :return: generator of keys in sorted order
+        """
+        return self.range(items=items)
+
+    def inorder_traversal(self):
+        """
+        :return: an array (Python list) of keys sorted according to the inorder traversal of self
+        """
+        return self.keys.tolist()
+
+
+# -------------------------------------------------------------------------------------------------------------------- #
+
+
+class _LegacyAVL(AVL):
+    """
+    The original AVL insert/delete, which climbs back up with find_parent from the root at every level
+    and rotates by allocating a new node and copying keys. Only kept as a baseline for the benchmarks below.
+    """
+
+    def __init__(self, root=None):
+        super(_LegacyAVL, self).__init__(root)
+        self.rotation_allocations = 0
+
+    def leftRotation(self, node):
+        self.rotation_allocations += 1
+        node.left = AVLNode(node.key, node.value, node.left, node.right.left)
+        self.updateHeight(node.left)
+        node.key = node.right.key
+        node.value = node.right.value
+        node.right = node.right.right
+        self.updateHeight(node)
+        return node
+
+    def rightRotation(self, node):
+        self.rotation_allocations += 1
+        node.right = AVLNode(node.key, node.value, node.left.right, node.right)
+        self.updateHeight(node.right)
+        node.key = node.left.key
+        node.value = node.left.value
+        node.left = node.left.left
+        self.updateHeight(node)
+        return node
+
+    def insert(self, key, value):
+        node = self.find(key)
+        if node:
+            node.value = value
+            return None
+        self.insert_node(key, value)
+        parent = self.find_parent(key)
+        while parent is not None:
+            self.updateHeight(parent)
+            if abs(parent.get_balance()) > 1:
+                self.reBalance(parent)
+            parent = self.find_parent(parent.key)
+
+    def delete(self, key):
+        node = self.find(key)
+        if node is None:
+            return NO_ITEM
+        path = self.delete_node(node)
+        parent = path[-1] if path else None
+        while parent is not None:
+            self.updateHeight(parent)
+            if abs(parent.get_balance()) > 1:
+                self.reBalance(parent)
+            parent = self.find_parent(parent.key)
+        return OK
+
+
+def benchmark_rebalance(n=100000, seed=0):
+    """
+    Compare the per-operation cost of AVL insert/delete against the original find_parent based climb
+    :param n: number of keys to insert and then delete
+    :param seed: seed for the key permutation
+    :return: dict mapping (tree name, operation) to microseconds per operation
+    """
+    rng = random.Random(seed)
+    keys = list(range(n))
+    rng.shuffle(keys)
+    results = {}
+    for name, cls in (('legacy', _LegacyAVL), ('AVL', AVL)):
+        tree = cls()
+        start = time.perf_counter()
+        for key in keys:
+            tree.insert(key, None)
+        results[(name, 'insert')] = (time.perf_counter() - start) / n * 1e6
+        start = time.perf_counter()
+        for key in keys:
+            tree.delete(key)
+        results[(name, 'delete')] = (time.perf_counter() - start) / n * 1e6
+    for (name, op), us in results.items():
+        print('{:>8} {:<7}: {:.2f} us/op'.format(name, op, us))
+    return results
+
+
+def benchmark_rotations(n=200000, seed=0):
+    """
+    Compare in-place rotations against the allocating ones under insert churn
+    :param n: number of keys inserted
+    :param seed: seed for the key permutation
+    :return: dict mapping tree name to (seconds, number of nodes allocated by rotations)
+    """
+    rng = random.Random(seed)
+    keys = list(range(n))
+    rng.shuffle(keys)
+    results = {}
+    for name, cls in (('legacy', _LegacyAVL), ('AVL', AVL)):
+        tree = cls()
+        gc.collect()
+        start = time.perf_counter()
+        for key in keys:
+            tree.insert(key, None)
+        elapsed = time.perf_counter() - start
+        results[name] = (elapsed, getattr(tree, 'rotation_allocations', 0))
+        print('{:>8}: {:.3f} s, {} nodes allocated by rotations'.format(name, *results[name]))
+    return results
+
+
+def benchmark_memory(n=200000, seed=0):
+    """
+    Report the memory footprint per key of each node storage backend
+    :param n: number of keys inserted
+    :param seed: seed for the key permutation
+    :return: dict mapping backend name to bytes per key
+    """
+    rng = random.Random(seed)
+    keys = list(range(n))
+    rng.shuffle(keys)
+    results = {}
+    for name, cls in (('BST', BST), ('AVL', AVL), ('ArrayAVL', ArrayAVL)):
+        gc.collect()
+        tracemalloc.start()
+        tree = cls()
+        for key in keys:
+            tree.insert(key, None)
+        current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        results[name] = current / n
+        print('{:>8}: {:.1f} bytes/key'.format(name, results[name]))
+        del tree
+    return results
+
+
+def benchmark_batch(n=100000, m=10000, seed=0):
+    """
+    Compare insert_many/delete_many against loops of single insert/delete calls,
+    for random batches, sorted batches and sorted batches past the largest key.
+    The insert and the delete phases are timed separately.
+    :param n: number of keys already in the tree
+    :param m: number of keys in the batch
+    :param seed: seed for the keys
+    :return: dict mapping (tree name, batch order, method, phase) to seconds
+    """
+    rng = random.Random(seed)
+    existing = rng.sample(range(4 * n), n)
+    results = {}
+    for order in ('random', 'sorted', 'append'):
+        if order == 'append':
+            batch = list(range(4 * n, 4 * n + m))
+        else:
+            batch = rng.sample(range(4 * n), m)
+        if order == 'sorted':
+            batch.sort()
+        for name, cls in (('BST', BST), ('AVL', AVL), ('PersistentAVL', PersistentAVL)):
+            for method in ('loop', 'batch'):
+                tree = cls()
+                for key in existing:
+                    tree.insert(key, None)
+                start = time.perf_counter()
+                if method == 'loop':
+                    for key in batch:
+                        tree.insert(key, None)
+                else:
+                    tree.insert_many((key, None) for key in batch)
+                results[(name, order, method, 'insert')] = time.perf_counter() - start
+                start = time.perf_counter()
+                if method == 'loop':
+                    for key in batch:
+                        tree.delete(key)
+                else:
+                    tree.delete_many(batch)
+                results[(name, order, method, 'delete')] = time.perf_counter() - start
+                print('{:>13} {:<6} {:<5}: insert {:.3f} s, delete {:.3f} s'.format(
+                    name, order, method, results[(name, order, method, 'insert')], results[(name, order, method, 'delete')]))
+    return results
+
+
+def benchmark_backends(n=20000, seed=0):
+    """
+    Compare insert, lookup and full scan throughput of BST, AVL and BPlusTree on random and sorted key streams.
+    BST is skipped on the sorted stream, where it degenerates into a linked list.
+    :param n: number of keys
+    :param seed: seed for the key permutation
+    :return: dict mapping (tree name, stream, operation) to operations per second
+    """
+    rng = random.Random(seed)
+    lookups = list(range(n))
+    rng.shuffle(lookups)
+    streams = {'random': lookups[::-1], 'sorted': list(range(n))}
+    results = {}
+    for stream, keys in streams.items():
+        for name, cls in (('BST', BST), ('AVL', AVL), ('BPlusTree', BPlusTree)):
+            if name == 'BST' and stream == 'sorted':
+                continue
+            tree = cls()
+            start = time.perf_counter()
+            for key in keys:
+                tree.insert(key, None)
+            results[(name, stream, 'insert')] = n / (time.perf_counter() - start)
+            start = time.perf_counter()
+            for key in lookups:
+                tree.find(key)
+            results[(name, stream, 'lookup')] = n / (time.perf_counter() - start)
+            start = time.perf_counter()
+            for _ in tree.iter_inorder():
+                pass
+            results[(name, stream, 'scan')] = n / (time.perf_counter() - start)
+            print('{:>9} {:<6}: '.format(name, stream) + ', '.join(
+                '{} {:.0f} ops/s'.format(op, results[(name, stream, op)]) for op in ('insert', 'lookup', 'scan')))
+    return results
+
 
+if __name__ == '__main__':
+    benchmark_rebalance()
+    benchmark_rotations()
+    benchmark_memory()
+    benchmark_batch()
+    benchmark_backends()
@@ -1,38 +1,145 @@
 
 # Import Packages
+import os
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 import numpy as np
 import scipy as sp
+from scipy.linalg import solve_triangular
+from scipy.sparse import csr_matrix
 from scipy.spatial.distance import cdist
-from scipy.stats import multivariate_normal as MVN
+from scipy.special import logsumexp
+try:
+    import resource
+except ImportError:
+    resource = None
 
 
 #===========================Fill This===========================#
-def InitKMeans(mX: np.ndarray, K: int, initMethod: int = 0, seedNum: int = 123) -> np.ndarray:
+def InitKMeans(mX: np.ndarray, K: int, initMethod: int = 0, seedNum: int = 123, numLocalTrials: int = None, overSampling: float = 2.0, numRounds: int = 5) -> np.ndarray:
     '''
     K-Means algorithm initialization.
     Args:
-        mX          - Input data with shape N x d.
-        K           - Number of clusters.
-        initMethod  - Initialization method: 0 - Random, 1 - K-Means++.
-        seedNum     - Seed number used.
+        mX              - Input data with shape N x d.
+        K               - Number of clusters.
+        initMethod      - Initialization method: 0 - Random, 1 - K-Means++, 2 - Greedy K-Means++, 3 - K-Means||.
+        seedNum         - Seed number used.
+        numLocalTrials  - Number of candidates per centroid of the Greedy K-Means++ (2 + log(K) if not given).
+        overSampling    - Expected number of candidates sampled per round of K-Means||, as a multiple of K.
+        numRounds       - Number of sampling rounds of K-Means||.
     Output:
-        mC          - The initial centroids with shape K x d.
+        mC              - The initial centroids with shape K x d.
     Remarks:
         - Given the same parameters, including the `seedNum` the algorithm must be reproducible.
+          The random numbers come from a local `np.random.Generator`, the global state of NumPy is untouched.
+        - K-Means++ samples each centroid with probability proportional to the squared distance to the nearest
+          centroid chosen so far (D^2 sampling), keeping a running minimum distance, in O(K * N * d) overall.
+        - K-Means|| samples about `overSampling * K` candidates per round in a single pass over the data
+          and reduces the weighted candidates to K centroids with K-Means++.
     '''
 
-    np.random.seed(seedNum)
+    oRng = np.random.default_rng(seedNum)
+    N = mX.shape[0]
     if initMethod == 0:
-        return mX[np.random.randint(mX.shape[0], size=K)]
-    else:
-        centroids = np.expand_dims(mX[np.random.randint(mX.shape[0])],axis=0)
-        for i in range(K-1):
-            distances = cdist(centroids, mX)
-            centroid_index =np.argmax(distances.min(axis=0))
-            centroids = np.vstack((centroids, mX[centroid_index]))
-        return centroids
+        return mX[oRng.choice(N, size = K, replace = False)]
+    if initMethod == 2:
+        return SeedKMeansPlusPlus(mX, K, oRng, numLocalTrials = numLocalTrials if numLocalTrials is not None else 2 + int(np.log(K)))
+    if initMethod == 3:
+        vD = np.full(N, np.inf)
+        lC = [mX[oRng.integers(N)][None, :]]
+        for _ in range(numRounds):
+            _, vDNew = AssignKMeans(mX, lC[-1])
+            np.minimum(vD, vDNew, out = vD)
+            totalD = vD.sum()
+            if totalD <= 0:
+                break
+            vIdx = np.flatnonzero(oRng.random(N) < overSampling * K * vD / totalD)
+            if vIdx.size == 0:
+                break
+            lC.append(mX[vIdx])
+        mCand = np.vstack(lC)
+        if mCand.shape[0] <= K:
+            return np.vstack((mCand, mX[oRng.choice(N, size = K - mCand.shape[0], replace = False)]))
+        vW = np.bincount(AssignKMeans(mX, mCand)[0], minlength = mCand.shape[0]).astype(np.float64)
+        return SeedKMeansPlusPlus(mCand, K, oRng, vW)
+    return SeedKMeansPlusPlus(mX, K, oRng)
+#===============================================================#
 
-    pass
+#===============================================================#
+def SeedKMeansPlusPlus(mX: np.ndarray, K: int, oRng: np.random.Generator, vW: np.ndarray = None, numLocalTrials: int = 1) -> np.ndarray:
+    '''
+    K-Means++ seeding by D^2 sampling.
+    Args:
+        mX              - Input data with shape N x d.
+        K               - Number of clusters.
+        oRng            - The random number generator used.
+        vW              - Weight of each sample with shape (N, ) (All ones if not given).
+        numLocalTrials  - Number of candidates sampled per centroid, the one reducing the weighted
+                          potential the most is kept (Greedy K-Means++ if larger than 1).
+    Output:
+        mC              - The initial centroids with shape K x d.
+    Remarks:
+        - A running minimum squared distance is updated per chosen centroid, so no distance is computed twice.
+    '''
+    N, d = mX.shape
+    vW = np.ones(N) if vW is None else vW
+    vXNorm = np.einsum('ij,ij->i', mX, mX)
+    mC = np.empty((K, d), dtype = mX.dtype)
+    mC[0] = mX[oRng.choice(N, p = vW / vW.sum())]
+    vD = np.maximum(vXNorm - 2 * (mX @ mC[0]) + mC[0] @ mC[0], 0)
+    for kk in range(1, K):
+        vCum = np.cumsum(vW * vD)
+        if vCum[-1] <= 0:
+            vCand = oRng.integers(N, size = numLocalTrials)
+        else:
+            vCand = np.minimum(np.searchsorted(vCum, oRng.random(numLocalTrials) * vCum[-1], side = 'right'), N - 1)
+        mD = np.maximum(vXNorm[:, None] - 2 * (mX @ mX[vCand].T) + vXNorm[vCand], 0)
+        np.minimum(mD, vD[:, None], out = mD)
+        bestIdx = (vW @ mD).argmin() if numLocalTrials > 1 else 0
+        mC[kk] = mX[vCand[bestIdx]]
+        vD = mD[:, bestIdx]
+    return mC
+#===============================================================#
+
+#===============================================================#
+def AssignKMeans(mX: np.ndarray, mC: np.ndarray, vXNorm: np.ndarray = None, memBudget: int = 2 ** 28, dataType: np.dtype = None) -> np.ndarray:
+    '''
+    K-Means assignment step.
+    Args:
+        mX          - The data with shape N x d.
+        mC          - The centroids with shape K x d.
+        vXNorm      - The squared norm of each sample with shape (N, ) (Computed if not given).
+        memBudget   - Maximum number of bytes used for the distances of a chunk of samples.
+        dataType    - Floating point type used for the distances (E.g. `np.float32`), the data type of `mX` by default.
+    Output:
+        vL          - The labels (0, 1, .., K - 1) per sample with shape (N, ).
+        vD          - The squared euclidean distance of each sample to its centroid with shape (N, ).
+    Remarks:
+        - The distances are computed as ||x||^2 - 2 x c + ||c||^2 with one matrix product per chunk of samples,
+          so the full K x N distance matrix is never materialized.
+        - Up to rounding of near ties the labels match `cdist(mC, mX).argmin(axis = 0)`.
+    '''
+    dataType = np.dtype(mX.dtype if dataType is None else dataType)
+    if vXNorm is None:
+        vXNorm = np.einsum('ij,ij->i', mX, mX)
+    N, K = mX.shape[0], mC.shape[0]
+    mCT = np.asarray(mC, dtype = dataType).T
+    vCNorm = np.einsum('ij,ij->j', mCT, mCT)
+    chunkSize = int(max(1, min(N, memBudget // (K * dataType.itemsize))))
+    vL = np.empty(N, dtype = np.intp)
+    vD = np.empty(N, dtype = dataType)
+    for ii in range(0, N, chunkSize):
+        mD = np.asarray(mX[ii:ii + chunkSize], dtype = dataType) @ mCT
+        mD *= -2
+        mD += vCNorm
+        vL[ii:ii + chunkSize] = mD.argmin(axis = 1)
+        vD[ii:ii + chunkSize] = np.take_along_axis(mD, vL[ii:ii + chunkSize, None], axis = 1)[:, 0]
+    vD += vXNorm
+    np.maximum(vD, 0, out = vD)
+    return vL, vD
 #===============================================================#
 
 #===========================Fill This===========================#
@@ -48,14 +155,184 @@ def CalcKMeansObj(mX: np.ndarray, mC: np.ndarray, vL: np.ndarray) -> float:
     Remarks:
         - The objective function uses the squared euclidean distance.
     '''
-    total_sum = 0
-    for k in range(len(mC)):
-        total_sum = total_sum + cdist(mX[vL== k], np.expand_dims(mC[k],axis=0)).sum()
-    return total_sum
+    return np.sqrt(np.einsum('ij,ij->i', mX - mC[vL], mX - mC[vL])).sum()
+#===============================================================#
+
+#===============================================================#
+def KMeansStep(mX: np.ndarray, mC: np.ndarray, vXNorm: np.ndarray = None, memBudget: int = 2 ** 28, dataType: np.dtype = None) -> np.ndarray:
+    '''
+    A single pass K-Means iteration: assignment, objective and centroid sums.
+    Args:
+        mX          - The data with shape N x d.
+        mC          - The centroids with shape K x d.
+        vXNorm      - The squared norm of each sample with shape (N, ) (Computed if not given).
+        memBudget   - Maximum number of bytes used for the distances of a chunk of samples.
+        dataType    - Floating point type used for the distances (See `AssignKMeans`).
+    Output:
+        vL          - The labels (0, 1, .., K - 1) per sample with shape (N, ).
+        objVal      - The value of the objective function of the KMeans for `mC` and `vL` (As `CalcKMeansObj`).
+        mS          - The sum of the samples of each cluster with shape K x d.
+        vN          - The number of samples of each cluster with shape (K, ).
+    Remarks:
+        - Each chunk of samples is read once: the distances give the labels and the objective,
+          and a sparse K x chunk indicator matrix accumulates the sums, so the cost is one
+          distance pass plus O(N * d).
+    '''
+    dataType = np.dtype(mX.dtype if dataType is None else dataType)
+    if vXNorm is None:
+        vXNorm = np.einsum('ij,ij->i', mX, mX)
+    (N, d), K = mX.shape, mC.shape[0]
+    chunkSize = int(max(1, min(N, memBudget // (K * dataType.itemsize))))
+    vL = np.empty(N, dtype = np.intp)
+    objVal = 0.0
+    mS = np.zeros((K, d))
+    for ii in range(0, N, chunkSize):
+        mXChunk = mX[ii:ii + chunkSize]
+        vLChunk, vDChunk = AssignKMeans(mXChunk, mC, vXNorm[ii:ii + chunkSize], memBudget, dataType)
+        vL[ii:ii + chunkSize] = vLChunk
+        objVal += np.sqrt(vDChunk).sum(dtype = np.float64)
+        numSamples = mXChunk.shape[0]
+        mI = csr_matrix((np.ones(numSamples), (vLChunk, np.arange(numSamples))), shape = (K, numSamples))
+        mS += mI @ mXChunk
+    vN = np.bincount(vL, minlength = K)
+    return vL, objVal, mS, vN
+#===============================================================#
+
+#===============================================================#
+def AssignKMeansTwoNearest(mX: np.ndarray, mC: np.ndarray, vXNorm: np.ndarray, memBudget: int = 2 ** 28) -> np.ndarray:
+    '''
+    K-Means assignment step which also reports the distance to the second nearest centroid.
+    Args:
+        mX          - The data with shape N x d.
+        mC          - The centroids with shape K x d.
+        vXNorm      - The squared norm of each sample with shape (N, ).
+        memBudget   - Maximum number of bytes used for the distances of a chunk of samples.
+    Output:
+        vL          - The labels (0, 1, .., K - 1) per sample with shape (N, ).
+        vD1         - The euclidean distance of each sample to its centroid with shape (N, ).
+        vD2         - The euclidean distance of each sample to the second nearest centroid with shape (N, ).
+    '''
+    N, K = mX.shape[0], mC.shape[0]
+    vCNorm = np.einsum('ij,ij->i', mC, mC)
+    chunkSize = int(max(1, min(N, memBudget // (K * 8))))
+    vL = np.empty(N, dtype = np.intp)
+    vD1 = np.empty(N)
+    vD2 = np.full(N, np.inf)
+    for ii in range(0, N, chunkSize):
+        mD = mX[ii:ii + chunkSize] @ mC.T
+        mD *= -2
+        mD += vCNorm
+        mD += vXNorm[ii:ii + chunkSize, None]
+        np.maximum(mD, 0, out = mD)
+        vL[ii:ii + chunkSize] = mD.argmin(axis = 1)
+        if K > 1:
+            mD2 = np.partition(mD, 1, axis = 1)
+            vD1[ii:ii + chunkSize] = mD2[:, 0]
+            vD2[ii:ii + chunkSize] = mD2[:, 1]
+        else:
+            vD1[ii:ii + chunkSize] = mD[:, 0]
+    return vL, np.sqrt(vD1), np.sqrt(vD2)
+#===============================================================#
+
+#===============================================================#
+def HamerlyStep(mX: np.ndarray, mC: np.ndarray, mCPrev: np.ndarray, vL: np.ndarray, vU: np.ndarray, vLow: np.ndarray, vXNorm: np.ndarray, memBudget: int = 2 ** 28, dStats: dict = None) -> np.ndarray:
+    '''
+    A K-Means iteration accelerated by the triangle inequality (Hamerly's algorithm).
+    Args:
+        mX          - The data with shape N x d.
+        mC          - The centroids with shape K x d.
+        mCPrev      - The centroids the bounds were computed for with shape K x d (Ignored on the first iteration).
+        vL          - The labels of the previous iteration with shape (N, ), `None` on the first iteration.
+        vU          - Upper bound on the distance of each sample to its centroid with shape (N, ).
+        vLow        - Lower bound on the distance of each sample to any other centroid with shape (N, ).
+        vXNorm      - The squared norm of each sample with shape (N, ).
+        memBudget   - Maximum number of bytes used for the distances of a chunk of samples.
+        dStats      - Dictionary whose 'numDistComputed' and 'numDistSkipped' counters are increased (Optional).
+    Output:
+        vL          - The labels (0, 1, .., K - 1) per sample with shape (N, ).
+        objVal      - The value of the objective function of the KMeans for `mC` and `vL` (As `CalcKMeansObj`).
+        mS          - The sum of the samples of each cluster with shape K x d.
+        vN          - The number of samples of each cluster with shape (K, ).
+        vU          - The updated upper bounds with shape (N, ).
+        vLow        - The updated lower bounds with shape (N, ).
+    Remarks:
+        - The distance of each sample to its own centroid is always evaluated (It is needed for the objective).
+          All K distances are evaluated only for samples where that distance exceeds both the lower bound
+          and half the distance from their centroid to the nearest other centroid, since no other sample
+          can change its label.
+        - Up to rounding of near ties the labels match the ones of `KMeansStep()`.
+        - The objective is summed from the exact distances to the assigned centroids, so it only depends on `mC` and `vL`.
+    '''
+    (N, d), K = mX.shape, mC.shape[0]
+    if vL is None:
+        vL, _, vLow = AssignKMeansTwoNearest(mX, mC, vXNorm, memBudget)
+        mR = mX - mC[vL]
+        vU = np.sqrt(np.einsum('ij,ij->i', mR, mR))
+        numComputed = N * K
+    else:
+        vMove = np.sqrt(np.einsum('ij,ij->i', mC - mCPrev, mC - mCPrev))
+        vLow = vLow.copy()
+        if K > 1:
+            vMoveSorted = np.sort(vMove)
+            vLow -= np.where(vL == vMove.argmax(), vMoveSorted[-2], vMoveSorted[-1])
+        mCC = cdist(mC, mC)
+        np.fill_diagonal(mCC, np.inf)
+        vS = 0.5 * mCC.min(axis = 1)
+        mR = mX - mC[vL]
+        vU = np.sqrt(np.einsum('ij,ij->i', mR, mR))
+        vIdx = np.flatnonzero(vU > np.maximum(vS[vL], vLow))
+        vL = vL.copy()
+        if vIdx.size > 0:
+            vL[vIdx], _, vLow[vIdx] = AssignKMeansTwoNearest(mX[vIdx], mC, vXNorm[vIdx], memBudget)
+            mR = mX[vIdx] - mC[vL[vIdx]]
+            vU[vIdx] = np.sqrt(np.einsum('ij,ij->i', mR, mR))
+        numComputed = N + vIdx.size * K
+    if dStats is not None:
+        dStats['numDistComputed'] = dStats.get('numDistComputed', 0) + numComputed
+        dStats['numDistSkipped'] = dStats.get('numDistSkipped', 0) + N * K - numComputed
+    objVal = vU.sum()
+    mS = csr_matrix((np.ones(N), (vL, np.arange(N))), shape = (K, N)) @ mX
+    vN = np.bincount(vL, minlength = K)
+    return vL, objVal, mS, vN, vU, vLow
+#===============================================================#
+
+#===============================================================#
+def HasConverged(objVal: float, lastObjVal: float, stopThr: float = 0, relThr: float = 0) -> bool:
+    '''
+    Stopping test of the iterative algorithms.
+    Args:
+        objVal      - The objective value of the current iteration.
+        lastObjVal  - The objective value of the previous iteration (`None` on the first iteration).
+        stopThr     - Absolute threshold on the change of the objective.
+        relThr      - Threshold on the change of the objective relative to its magnitude.
+    Output:
+        hasConverged - Whether the change is at most `max(stopThr, relThr * |objVal|)`.
+    '''
+    if lastObjVal is None:
+        return False
+    return abs(objVal - lastObjVal) <= max(stopThr, relThr * abs(objVal))
+
+def MemoryPeak() -> int:
+    '''
+    Peak memory in bytes: the peak traced since the last call if `tracemalloc` is tracing,
+    else the peak resident set size of the process (`None` where it isn't available).
+    Remarks:
+        - Without `tracemalloc` the value is the maximum over the lifetime of the process, not per call,
+          so it only grows and doesn't show the memory of a single iteration.
+        - `ru_maxrss` is in kilobytes on Linux and in bytes on macOS.
+    '''
+    if tracemalloc.is_tracing():
+        memPeak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.reset_peak()
+        return memPeak
+    if resource is None:
+        return None
+    maxRss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxRss if sys.platform == 'darwin' else maxRss * 1024
 #===============================================================#
 
 #===========================Fill This===========================#
-def KMeans(mX: np.ndarray, mC: np.ndarray, numIter: int = 1000, stopThr: float = 0) -> np.ndarray:
+def KMeans(mX: np.ndarray, mC: np.ndarray, numIter: int = 1000, stopThr: float = 0, memBudget: int = 2 ** 28, dataType: np.dtype = None, accelMethod: int = 0, dStats: dict = None, relThr: float = 0, hCallback = None) -> np.ndarray:
     '''
     K-Means algorithm.
     Args:
@@ -63,110 +340,702 @@ def KMeans(mX: np.ndarray, mC: np.ndarray, numIter: int = 1000, stopThr: float =
         mC          - The initial centroids with shape K x d.
         numIter     - Number of iterations.
         stopThr     - Stopping threshold.
+        memBudget   - Maximum number of bytes used for the distances of a chunk of samples (See `AssignKMeans`).
+        dataType    - Floating point type used for the distances (See `AssignKMeans`).
+        accelMethod - Acceleration method: 0 - None (Lloyd), 1 - Triangle inequality bounds (Hamerly).
+        dStats      - Dictionary whose 'numDistComputed' and 'numDistSkipped' counters are increased (Optional).
+        relThr      - Stopping threshold relative to the objective value.
+        hCallback   - Function called after each iteration with a dictionary of its metrics (Optional, See Remarks).
     Output:
         mC          - The final centroids with shape K x d.
         vL          - The labels (0, 1, .., K - 1) per sample with shape (N, )
         lO          - The objective value function per iterations (List).
     Remarks:
         - The maximum number of iterations must be `numIter`.
-        - If the objective value of the algorithm doesn't improve by at least `stopThr` the iterations should stop.
+        - If the objective value of the algorithm doesn't change by more than `stopThr` or `relThr` times
+          its magnitude the iterations should stop (See `HasConverged()`).
+        - If no label changes the centroids are a fixed point and the iterations stop.
+        - A centroid which loses all of its samples is kept in place.
+        - The accelerated mode computes the distances in float64 and ignores `dataType`.
+        - The metrics are: 'iter', 'objVal', 'numChanged' (Labels changed, N on the first iteration),
+          'timeAssign' (The fused assignment, objective and sums pass), 'timeObj' (Stopping tests),
+          'timeUpdate' (Centroids update) in [Sec] and 'memPeak' in bytes (See `MemoryPeak()`).
+          'memPeak' is the peak of the iteration only while `tracemalloc` is tracing, else the process lifetime peak.
     '''
 
-    last_KMeansObj = 0
+    last_KMeansObj = None
     lO = []
+    vXNorm = np.einsum('ij,ij->i', mX, mX)
+    vL, vU, vLow, mCPrev = None, None, None, None
     for i in range(numIter):
-        vL = cdist(mC, mX).argmin(axis=0)
-        KMeansObj = CalcKMeansObj(mX, mC, vL)
+        startTime = time.perf_counter()
+        vLPrev = vL
+        if accelMethod == 1:
+            vL, KMeansObj, mS, vN, vU, vLow = HamerlyStep(mX, mC, mCPrev, vL, vU, vLow, vXNorm, memBudget, dStats)
+            mCPrev = mC
+        else:
+            vL, KMeansObj, mS, vN = KMeansStep(mX, mC, vXNorm, memBudget, dataType)
+            if dStats is not None:
+                dStats['numDistComputed'] = dStats.get('numDistComputed', 0) + mX.shape[0] * mC.shape[0]
+                dStats['numDistSkipped'] = dStats.get('numDistSkipped', 0)
         lO.append(KMeansObj)  
-        if (KMeansObj-last_KMeansObj) == stopThr:
+        assignTime = time.perf_counter()
+        numChanged = mX.shape[0] if vLPrev is None else int(np.count_nonzero(vL != vLPrev))
+        isDone = (numChanged == 0) or HasConverged(KMeansObj, last_KMeansObj, stopThr, relThr)
+        objTime = time.perf_counter()
+        if not isDone:
+            vNonEmpty = vN > 0
+            mC = np.array(mC, dtype = np.float64)
+            mC[vNonEmpty] = mS[vNonEmpty] / vN[vNonEmpty, None]
+            last_KMeansObj = KMeansObj
+        if hCallback is not None:
+            hCallback({'iter': i, 'objVal': KMeansObj, 'numChanged': numChanged, 'timeAssign': assignTime - startTime,
+                       'timeObj': objTime - assignTime, 'timeUpdate': time.perf_counter() - objTime, 'memPeak': MemoryPeak()})
+        if isDone:
             break
-        mC = np.array([mX[vL == k].mean(axis=0) for k in range(len(mC))])
-        last_KMeansObj = KMeansObj
     return mC, vL, lO 
 #===============================================================#
 
+#===============================================================#
+def PartialFitKMeans(mX: np.ndarray, mC: np.ndarray, vN: np.ndarray, memBudget: int = 2 ** 28, dataType: np.dtype = None) -> np.ndarray:
+    '''
+    Mini-batch K-Means update from a single chunk of samples.
+    Args:
+        mX          - A chunk of the data with shape n x d.
+        mC          - The current centroids with shape K x d.
+        vN          - The number of samples assigned to each centroid so far with shape (K, ).
+        memBudget   - Maximum number of bytes used for the distances of a chunk of samples.
+        dataType    - Floating point type used for the distances (See `AssignKMeans`).
+    Output:
+        mC          - The updated centroids with shape K x d.
+        vN          - The updated number of samples assigned to each centroid with shape (K, ).
+        objVal      - The value of the objective function of the KMeans on the chunk, before the update.
+    Remarks:
+        - Each centroid moves to the running mean of all the samples ever assigned to it,
+          i.e. a per centroid learning rate of 1 / count.
+        - The inputs are not modified.
+    '''
+    _, objVal, mS, vNChunk = KMeansStep(mX, mC, None, memBudget, dataType)
+    vN = vN + vNChunk
+    vNonEmpty = vNChunk > 0
+    mC = np.array(mC, dtype = np.float64)
+    mC[vNonEmpty] += (mS[vNonEmpty] - vNChunk[vNonEmpty, None] * mC[vNonEmpty]) / vN[vNonEmpty, None]
+    return mC, vN, objVal
+#===============================================================#
+
+#===============================================================#
+def MiniBatchKMeans(itX, mC: np.ndarray, vN: np.ndarray = None, memBudget: int = 2 ** 28, dataType: np.dtype = None) -> np.ndarray:
+    '''
+    Streaming (Mini-batch) K-Means algorithm over data which does not fit in memory.
+    Args:
+        itX         - Iterable of chunks of the data, each with shape n x d (E.g. `IterParquetChunks()`).
+        mC          - The initial centroids with shape K x d.
+        vN          - The number of samples assigned to each centroid so far with shape (K, ) (Zeros if not given).
+        memBudget   - Maximum number of bytes used for the distances of a chunk of samples.
+        dataType    - Floating point type used for the distances (See `AssignKMeans`).
+    Output:
+        mC          - The final centroids with shape K x d.
+        vN          - The number of samples assigned to each centroid with shape (K, ).
+        lO          - The objective value function per chunk (List).
+    Remarks:
+        - Only one chunk is held in memory at a time.
+        - Pass the returned `mC` and `vN` back to run another epoch or to continue on new data.
+        - The initial centroids can be set by `InitKMeans()` on the first chunk.
+    '''
+    if vN is None:
+        vN = np.zeros(mC.shape[0], dtype = np.int64)
+    lO = []
+    for mXChunk in itX:
+        mC, vN, objVal = PartialFitKMeans(np.asarray(mXChunk), mC, vN, memBudget, dataType)
+        lO.append(objVal)
+    return mC, vN, lO
+#===============================================================#
+
+#===============================================================#
+def IterParquetChunks(filePath: str, lColumns: list = None, batchSize: int = 65536):
+    '''
+    Reads a Parquet file as a sequence of chunks of samples.
+    Args:
+        filePath    - Path of the Parquet file.
+        lColumns    - The columns used as the features (List), all of them if not given.
+        batchSize   - Maximum number of rows per chunk.
+    Output:
+        Generator of the chunks, each a float64 array with shape n x d.
+    Remarks:
+        - Requires `pyarrow`.
+    '''
+    import pyarrow.parquet as pq
+
+    for recordBatch in pq.ParquetFile(filePath).iter_batches(batch_size = batchSize, columns = lColumns):
+        yield np.column_stack([vCol.to_numpy(zero_copy_only = False) for vCol in recordBatch.columns]).astype(np.float64)
+#===============================================================#
+
 ### GMM ###
 
+#===============================================================#
+def CheckCovType(covType: str) -> None:
+    '''
+    Validates the covariance type of the GMM functions.
+    Args:
+        covType     - Covariance type: 'full', 'diag', 'spherical' or 'tied'.
+    Remarks:
+        - Raises a `ValueError` for any other value, instead of treating it as 'full'.
+    '''
+    if covType not in ('full', 'diag', 'spherical', 'tied'):
+        raise ValueError(f"covType must be 'full', 'diag', 'spherical' or 'tied', got {covType!r}")
+#===============================================================#
+
 #===========================Fill This===========================#
-def InitGmm(mX: np.ndarray, K: int, seedNum: int = 123) -> np.ndarray:
+def InitGmm(mX: np.ndarray, K: int, seedNum: int = 123, covType: str = 'full') -> np.ndarray:
     '''
     GMM algorithm initialization.
     Args:
         mX          - Input data with shape N x d.
         K           - Number of clusters.
         seedNum     - Seed number used.
+        covType     - Covariance type: 'full', 'diag', 'spherical' or 'tied'.
     Output:
         mμ          - The initial mean vectors with shape K x d.
-        tΣ          - The initial covariance matrices with shape (d x d x K).
+        tΣ          - The initial covariances with the shape of `covType` (See `GMM()`).
         vW          - The initial weights of the GMM with shape K.
     Remarks:
         - Given the same parameters, including the `seedNum` the algorithm must be reproducible.
         - mμ Should be initialized by the K-Means++ algorithm.
     '''
     d=mX.shape[1]
-    mμ = InitKMeans(mX,K,seedNum)
-    a = np.eye(d) * mX.var()
-    tΣ =  np.zeros((d,d,K)) + np.expand_dims(a,axis=2)
+    CheckCovType(covType)
+    mμ = InitKMeans(mX,K,1,seedNum)
+    if covType == 'diag':
+        tΣ = np.full((d, K), mX.var())
+    elif covType == 'spherical':
+        tΣ = np.full(K, mX.var())
+    elif covType == 'tied':
+        tΣ = np.eye(d) * mX.var()
+    else:
+        a = np.eye(d) * mX.var()
+        tΣ =  np.zeros((d,d,K)) + np.expand_dims(a,axis=2)
     vW = np.ones(K) * 1/K
     return mμ, tΣ, vW
 #===============================================================#
 
+#===============================================================#
+def CalcGmmLogProb(mX: np.ndarray, mμ: np.ndarray, tΣ: np.ndarray, vW: np.ndarray, memBudget: int = 2 ** 28, covType: str = 'full') -> np.ndarray:
+    '''
+    Weighted log likelihood of each sample under each component of the GMM.
+    Args:
+        mX          - The data with shape N x d.
+        mμ          - The mean vectors with shape K x d.
+        tΣ          - The covariances with the shape of `covType` (See `GMM()`).
+        vW          - The weights of the GMM with shape K.
+        memBudget   - Maximum number of bytes used for the whitened samples of a chunk of samples.
+        covType     - Covariance type: 'full', 'diag', 'spherical' or 'tied'.
+    Output:
+        mLogP       - log(vW[k]) + log N(mX[i]; mμ[k], Σ[k]) with shape N x K.
+    Remarks:
+        - Each full covariance is factorized once (Cholesky, Σ = L L^T). The samples are whitened by all
+          the K inverse factors with a single matrix product per chunk of samples.
+        - The 'diag', 'spherical' and 'tied' types need no factorization per component, their Mahalanobis
+          terms are expanded into matrix products with the precisions, in O(N * K * d).
+        - Everything is kept in log space, so it doesn't underflow in high dimensions.
+    '''
+    CheckCovType(covType)
+    (N, d), K = mX.shape, mμ.shape[0]
+    if covType == 'diag':
+        mP = 1 / tΣ
+        mM = (mX * mX) @ mP - 2 * (mX @ (mμ.T * mP)) + np.einsum('kj,jk->k', mμ * mμ, mP)
+        vLogDet = np.log(tΣ).sum(axis = 0)
+    elif covType == 'spherical':
+        vXNorm = np.einsum('ij,ij->i', mX, mX)
+        mM = (vXNorm[:, None] - 2 * (mX @ mμ.T) + np.einsum('ij,ij->i', mμ, mμ)) / tΣ
+        vLogDet = d * np.log(tΣ)
+    elif covType == 'tied':
+        mL = np.linalg.cholesky(tΣ)
+        mXW = solve_triangular(mL, mX.T, lower = True).T
+        mμW = solve_triangular(mL, mμ.T, lower = True).T
+        mM = np.einsum('ij,ij->i', mXW, mXW)[:, None] - 2 * (mXW @ mμW.T) + np.einsum('ij,ij->i', mμW, mμW)
+        vLogDet = np.full(K, 2 * np.log(np.diag(mL)).sum())
+    if covType in ('diag', 'spherical', 'tied'):
+        np.maximum(mM, 0, out = mM)
+        return np.log(vW) - 0.5 * (d * np.log(2 * np.pi) + vLogDet + mM)
+    tL = np.linalg.cholesky(np.moveaxis(tΣ, 2, 0))
+    tLInv = np.linalg.solve(tL, np.broadcast_to(np.eye(d), (K, d, d)))
+    mLInv = tLInv.reshape(K * d, d)
+    mB = np.einsum('kij,kj->ki', tLInv, mμ)
+    vLogDet = 2 * np.log(np.diagonal(tL, axis1 = 1, axis2 = 2)).sum(axis = 1)
+    vConst = np.log(vW) - 0.5 * (d * np.log(2 * np.pi) + vLogDet)
+    chunkSize = int(max(1, min(N, memBudget // (K * d * 8))))
+    mLogP = np.empty((N, K))
+    for ii in range(0, N, chunkSize):
+        tZ = (mX[ii:ii + chunkSize] @ mLInv.T).reshape(-1, K, d)
+        tZ -= mB
+        mLogP[ii:ii + chunkSize] = vConst - 0.5 * np.einsum('nki,nki->nk', tZ, tZ)
+    return mLogP
+#===============================================================#
+
+#===============================================================#
+def GmmEStep(mX: np.ndarray, mμ: np.ndarray, tΣ: np.ndarray, vW: np.ndarray, memBudget: int = 2 ** 28, covType: str = 'full') -> np.ndarray:
+    '''
+    GMM expectation step.
+    Args:
+        mX          - The data with shape N x d.
+        mμ          - The mean vectors with shape K x d.
+        tΣ          - The covariances with the shape of `covType` (See `GMM()`).
+        vW          - The weights of the GMM with shape K.
+        memBudget   - Maximum number of bytes used for the whitened samples of a chunk of samples.
+        covType     - Covariance type: 'full', 'diag', 'spherical' or 'tied'.
+    Output:
+        objVal      - The value of the objective function of the GMM (As `CalcGmmObj`).
+        mR          - The responsibility of each component for each sample with shape N x K.
+    Remarks:
+        - The objective and the responsibilities come from the same log likelihoods (See `CalcGmmLogProb()`).
+    '''
+    mLogP = CalcGmmLogProb(mX, mμ, tΣ, vW, memBudget, covType)
+    vLogLik = logsumexp(mLogP, axis = 1)
+    mLogP -= vLogLik[:, None]
+    return -vLogLik.sum(), np.exp(mLogP, out = mLogP)
+#===============================================================#
+
+#===============================================================#
+def GmmMStep(mX: np.ndarray, mR: np.ndarray, covType: str = 'full', regCovar: float = 1e-6) -> np.ndarray:
+    '''
+    GMM maximization step.
+    Args:
+        mX          - The data with shape N x d.
+        mR          - The responsibility of each component for each sample with shape N x K.
+        covType     - Covariance type: 'full', 'diag', 'spherical' or 'tied'.
+        regCovar    - Non negative value added to the variances so the covariances stay positive definite.
+    Output:
+        mμ          - The mean vectors with shape K x d.
+        tΣ          - The covariances with the shape of `covType` (See `GMM()`).
+        vW          - The weights of the GMM with shape K.
+    Remarks:
+        - The 'diag', 'spherical' and 'tied' covariances come from the weighted second moments
+          in O(N * K * d) and O(N * d^2), no per component d x d matrix is formed (See `GmmSuffStats()`).
+        - The 'full' covariances are computed from the centered samples, which is more accurate than
+          their second moments.
+    '''
+    if covType != 'full':
+        return GmmStatsMStep(mX.shape[0], *GmmSuffStats(mX, mR, covType), covType, regCovar)
+    (N, d), K = mX.shape, mR.shape[1]
+    N_k = mR.sum(axis=0) + 10 * np.finfo(mR.dtype).eps
+    vW = N_k / N
+    mμ = (mR.T @ mX) / N_k[:,None]
+    tΣ = np.empty((d, d, K))
+    for k in range(K):
+        mXC = mX - mμ[k]
+        tΣ[..., k] = (mR[:, k, None] * mXC).T @ mXC / N_k[k] + regCovar * np.eye(d)
+    return mμ, tΣ, vW
+#===============================================================#
+
+#===============================================================#
+def GmmSuffStats(mX: np.ndarray, mR: np.ndarray, covType: str = 'full') -> np.ndarray:
+    '''
+    The sufficient statistics of the GMM maximization step.
+    Args:
+        mX          - The data with shape N x d.
+        mR          - The responsibility of each component for each sample with shape N x K.
+        covType     - Covariance type: 'full', 'diag', 'spherical' or 'tied'.
+    Output:
+        vN          - The sum of the responsibilities of each component with shape K.
+        mS          - The responsibility weighted sum of the samples of each component with shape K x d.
+        tS          - The second moments: 'full' - (d x d x K), 'diag' / 'spherical' - K x d, 'tied' - d x d.
+    Remarks:
+        - The statistics of disjoint sets of samples are summed, so the rows may be split between workers.
+    '''
+    CheckCovType(covType)
+    (N, d), K = mX.shape, mR.shape[1]
+    vN = mR.sum(axis = 0)
+    mS = mR.T @ mX
+    if covType in ('diag', 'spherical'):
+        tS = mR.T @ (mX * mX)
+    elif covType == 'tied':
+        tS = mX.T @ mX
+    else:
+        tS = np.empty((d, d, K))
+        for k in range(K):
+            tS[..., k] = (mR[:, k, None] * mX).T @ mX
+    return vN, mS, tS
+#===============================================================#
+
+#===============================================================#
+def GmmStatsMStep(N: int, vN: np.ndarray, mS: np.ndarray, tS: np.ndarray, covType: str = 'full', regCovar: float = 1e-6) -> np.ndarray:
+    '''
+    GMM maximization step from the sufficient statistics (See `GmmSuffStats()`).
+    Args:
+        N           - The number of samples.
+        vN, mS, tS  - The sufficient statistics of all samples.
+        covType     - Covariance type: 'full', 'diag', 'spherical' or 'tied'.
+        regCovar    - Non negative value added to the variances so the covariances stay positive definite.
+    Output:
+        mμ          - The mean vectors with shape K x d.
+        tΣ          - The covariances with the shape of `covType` (See `GMM()`).
+        vW          - The weights of the GMM with shape K.
+    '''
+    CheckCovType(covType)
+    K, d = mS.shape
+    N_k = vN + 10 * np.finfo(np.float64).eps
+    vW = N_k / N
+    mμ = mS / N_k[:,None]
+    if covType in ('diag', 'spherical'):
+        mVar = tS / N_k[:, None] - mμ * mμ
+        mVar = np.maximum(mVar, 0) + regCovar
+        tΣ = mVar.T if covType == 'diag' else mVar.mean(axis = 1)
+    elif covType == 'tied':
+        tΣ = (tS - (N_k[:, None] * mμ).T @ mμ) / N_k.sum() + regCovar * np.eye(d)
+    else:
+        tΣ = tS / N_k - np.einsum('kj,kl->jlk', mμ, mμ) + (regCovar * np.eye(d))[..., None]
+    return mμ, tΣ, vW
+#===============================================================#
+
 #===========================Fill This===========================#
-def CalcGmmObj(mX: np.ndarray, mμ: np.ndarray, tΣ: np.ndarray, vW: np.ndarray) -> float:
+def CalcGmmObj(mX: np.ndarray, mμ: np.ndarray, tΣ: np.ndarray, vW: np.ndarray, covType: str = 'full') -> float:
     '''
     GMM algorithm objective function.
     Args:
         mX          - The data with shape N x d.
         mμ          - The initial mean vectors with shape K x d.
-        tΣ          - The initial covariance matrices with shape (d x d x K).
+        tΣ          - The initial covariances with the shape of `covType` (See `GMM()`).
         vW          - The initial weights of the GMM with shape K.
+        covType     - Covariance type: 'full', 'diag', 'spherical' or 'tied'.
     Output:
         objVal      - The value of the objective function of the GMM.
     Remarks:
         - A
     '''
-    GmmObj = np.zeros(mX.shape[0])
-    for i, weight in enumerate(vW):
-        GmmObj = GmmObj + MVN.pdf(mX,mμ[i], tΣ[...,i]) * weight
-    return -np.log(GmmObj).sum()
+    return -logsumexp(CalcGmmLogProb(mX, mμ, tΣ, vW, covType = covType), axis = 1).sum()
 #===============================================================#
 
 #===========================Fill This===========================#
-def GMM(mX: np.ndarray, mμ: np.ndarray, tΣ: np.ndarray, vW: np.ndarray, numIter: int = 1000, stopThr: float = 1e-5) -> np.ndarray:
+def GMM(mX: np.ndarray, mμ: np.ndarray, tΣ: np.ndarray, vW: np.ndarray, numIter: int = 1000, stopThr: float = 1e-5, covType: str = 'full', regCovar: float = 1e-6, relThr: float = 0, hCallback = None) -> np.ndarray:
     '''
     GMM algorithm.
     Args:p
         mX          - Input data with shape N x d.
         mμ          - The initial mean vectors with shape K x d.
-        tΣ          - The initial covariance matrices with shape (d x d x K).
+        tΣ          - The initial covariances with the shape of `covType`.
         vW          - The initial weights of the GMM with shape K.
         numIter     - Number of iterations.
         stopThr     - Stopping threshold.
+        covType     - Covariance type, which sets the shape of `tΣ`:
+                      'full'      - A covariance matrix per component, shape (d x d x K).
+                      'diag'      - A diagonal covariance per component, the variances with shape (d x K).
+                      'spherical' - A scaled identity covariance per component, the variances with shape K.
+                      'tied'      - A single covariance matrix shared by all components, shape (d x d).
+        regCovar    - Non negative value added to the variances so the covariances stay positive definite.
+        relThr      - Stopping threshold relative to the objective value.
+        hCallback   - Function called after each iteration with a dictionary of its metrics (Optional, See Remarks).
     Output:
         mμ          - The final mean vectors with shape K x d.
-        tΣ          - The final covariance matrices with shape (d x d x K).
+        tΣ          - The final covariances with the shape of `covType`.
         vW          - The final weights of the GMM with shape K.
         vL          - The labels (0, 1, .., K - 1) per sample with shape (N, )
         lO          - The objective function value per iterations (List).
     Remarks:
         - The maximum number of iterations must be `numIter`.
-        - If the objective value of the algorithm doesn't improve by at least `stopThr` the iterations should stop.
+        - If the objective value of the algorithm doesn't change by more than `stopThr` or `relThr` times
+          its magnitude the iterations should stop (See `HasConverged()`).
+        - The objective and the responsibilities of an iteration come from a single E-step (See `GmmEStep()`).
+        - The metrics are as in `KMeans()`, with 'timeAssign' the E-step, 'timeObj' the labels and the
+          stopping test and 'timeUpdate' the M-step. The labels are the most responsible components.
     '''
-    last_Obj = 0
+    CheckCovType(covType)
+    last_Obj = None
     lO = []
+    vL = None
     for i in range(numIter):
-        Obj = CalcGmmObj(mX, mμ, tΣ, vW)
+        startTime = time.perf_counter()
+        Obj, mR = GmmEStep(mX, mμ, tΣ, vW, covType = covType)
         lO.append(Obj)
-        x = np.array([MVN.pdf(mX, mμ[w], tΣ[...,w])* weight for w, weight in enumerate(vW)])
-        if abs(Obj-last_Obj) < stopThr:
-            vL = x.argmax(axis=0)
+        assignTime = time.perf_counter()
+        vLPrev, vL = vL, mR.argmax(axis=1)
+        numChanged = mX.shape[0] if vLPrev is None else int(np.count_nonzero(vL != vLPrev))
+        isDone = HasConverged(Obj, last_Obj, stopThr, relThr)
+        objTime = time.perf_counter()
+        if not isDone:
+            last_Obj = Obj
+            mμ, tΣ, vW = GmmMStep(mX, mR, covType, regCovar)
+        if hCallback is not None:
+            hCallback({'iter': i, 'objVal': Obj, 'numChanged': numChanged, 'timeAssign': assignTime - startTime,
+                       'timeObj': objTime - assignTime, 'timeUpdate': time.perf_counter() - objTime, 'memPeak': MemoryPeak()})
+        if isDone:
             break
-        last_Obj = Obj
-        p_x = (x/ x.sum(axis=0))
-        N_k = p_x.sum(axis=1)
-        vW = N_k / p_x.shape[1]
-        mμ = (p_x @ mX) / N_k[:,None]
-        tΣ = np.array([(p_x[i][:,None] * (mX - mμ[i])).T @ (mX - mμ[i]) /n for i, n in enumerate(N_k)]).T
 
     return mμ, tΣ, vW, vL, lO 
-#===============================================================#
\ No newline at end of file
+#===============================================================#
+
+#===============================================================#
+# Shared arrays of the worker processes, attached once per worker by `_AttachShared()`
+_dShared = {}
+
+def ShareArray(mA: np.ndarray) -> tuple:
+    '''
+    Copies an array into a new shared memory block.
+    Args:
+        mA          - The array.
+    Output:
+        oShm        - The shared memory block. The caller must `close()` and `unlink()` it.
+        tSpec       - The (name, shape, data type) needed to attach to the block (See `_AttachShared()`).
+    '''
+    mA = np.ascontiguousarray(mA)
+    oShm = shared_memory.SharedMemory(create = True, size = max(1, mA.nbytes))
+    np.ndarray(mA.shape, dtype = mA.dtype, buffer = oShm.buf)[...] = mA
+    return oShm, (oShm.name, mA.shape, mA.dtype.str)
+
+def _AttachShared(dSpecs: dict) -> None:
+    '''
+    Worker initializer: maps the shared arrays into `_dShared` without copying them.
+    Remarks:
+        - The workers share the resource tracker of the parent, which unlinks the blocks.
+    '''
+    for arrName, (shmName, tShape, dataType) in dSpecs.items():
+        oShm = shared_memory.SharedMemory(name = shmName)
+        _dShared[arrName] = (oShm, np.ndarray(tShape, dtype = dataType, buffer = oShm.buf))
+
+def _FitRestartWorker(algoName: str, K: int, seedNum: int, dFitArgs: dict) -> tuple:
+    '''
+    Worker: initializes and fits a single restart on the shared data.
+    '''
+    mX = _dShared['mX'][1]
+    dFitArgs = dict(dFitArgs)
+    if algoName == 'KMeans':
+        mC = InitKMeans(mX, K, dFitArgs.pop('initMethod', 1), seedNum)
+        tResult = KMeans(mX, mC, **dFitArgs)
+    else:
+        mμ, tΣ, vW = InitGmm(mX, K, seedNum, dFitArgs.get('covType', 'full'))
+        tResult = GMM(mX, mμ, tΣ, vW, **dFitArgs)
+    return tResult[-1][-1], seedNum, tResult
+
+def _KMeansShardWorker(ii: int, jj: int, mC: np.ndarray, memBudget: int, dataType: np.dtype) -> tuple:
+    '''
+    Worker: a K-Means step on the rows ii:jj of the shared data, the labels are written to the shared labels.
+    '''
+    mX = _dShared['mX'][1][ii:jj]
+    vL, objVal, mS, vN = KMeansStep(mX, mC, None, memBudget, dataType)
+    numChanged = np.count_nonzero(vL != _dShared['vL'][1][ii:jj])
+    _dShared['vL'][1][ii:jj] = vL
+    return objVal, mS, vN, numChanged
+
+def _GmmShardWorker(ii: int, jj: int, mμ: np.ndarray, tΣ: np.ndarray, vW: np.ndarray, covType: str, memBudget: int) -> tuple:
+    '''
+    Worker: an E-step and the sufficient statistics on the rows ii:jj of the shared data.
+    '''
+    mX = _dShared['mX'][1][ii:jj]
+    objVal, mR = GmmEStep(mX, mμ, tΣ, vW, memBudget, covType)
+    _dShared['vL'][1][ii:jj] = mR.argmax(axis = 1)
+    return (objVal, ) + GmmSuffStats(mX, mR, covType)
+
+def _ShardRanges(N: int, numShards: int) -> list:
+    vEdges = np.linspace(0, N, numShards + 1).astype(np.intp)
+    return [(ii, jj) for ii, jj in zip(vEdges[:-1], vEdges[1:]) if jj > ii]
+#===============================================================#
+
+#===============================================================#
+def ParallelRestarts(mX: np.ndarray, K: int, lSeeds: list, algoName: str = 'KMeans', numWorkers: int = None, dFitArgs: dict = None) -> tuple:
+    '''
+    Fits K-Means or GMM from many seeds in parallel and keeps the best objective.
+    Args:
+        mX          - Input data with shape N x d.
+        K           - Number of clusters.
+        lSeeds      - The seed number of each restart (List).
+        algoName    - 'KMeans' or 'GMM'.
+        numWorkers  - Number of worker processes (Defaults to the number of CPUs).
+        dFitArgs    - Keyword arguments of `KMeans()` / `GMM()`. For 'KMeans' it may also set
+                      'initMethod' (See `InitKMeans()`, defaults to K-Means++).
+    Output:
+        tBest       - The output of `KMeans()` / `GMM()` of the restart with the lowest final objective.
+        vObj        - The final objective value of each seed with shape len(lSeeds).
+    Remarks:
+        - `mX` is copied once into shared memory, the workers map it rather than receiving a copy.
+        - Each restart is the same as the serial initialization + fit with its seed.
+        - Set the BLAS threads (`OMP_NUM_THREADS` etc.) to 1 when using many workers, to avoid oversubscription.
+    '''
+    oShm, tSpec = ShareArray(mX)
+    try:
+        with ProcessPoolExecutor(numWorkers, initializer = _AttachShared, initargs = ({'mX': tSpec}, )) as oPool:
+            lFutures = [oPool.submit(_FitRestartWorker, algoName, K, seedNum, dFitArgs or {}) for seedNum in lSeeds]
+            lResults = [oFuture.result() for oFuture in lFutures]
+    finally:
+        oShm.close()
+        oShm.unlink()
+    vObj = np.array([objVal for objVal, _, _ in lResults])
+    return lResults[np.argmin(vObj)][2], vObj
+#===============================================================#
+
+#===============================================================#
+def ShardedKMeans(mX: np.ndarray, mC: np.ndarray, numIter: int = 1000, stopThr: float = 0, numWorkers: int = None, memBudget: int = 2 ** 28, dataType: np.dtype = None) -> np.ndarray:
+    '''
+    K-Means algorithm with the samples split between worker processes.
+    Args:
+        mX          - Input data with shape N x d.
+        mC          - The initial centroids with shape K x d.
+        numIter     - Number of iterations.
+        stopThr     - Stopping threshold.
+        numWorkers  - Number of worker processes, one shard of rows per worker (Defaults to the number of CPUs).
+        memBudget   - Maximum number of bytes used for the distances of a chunk of samples per worker.
+        dataType    - Floating point type used for the distances (See `AssignKMeans`).
+    Output:
+        mC          - The final centroids with shape K x d.
+        vL          - The labels (0, 1, .., K - 1) per sample with shape (N, )
+        lO          - The objective value function per iterations (List).
+    Remarks:
+        - Each iteration the workers return the objective, the sums and the counts of their shard,
+          only O(K * d) per worker, which are reduced into the centroids (Same iterations as `KMeans()`).
+    '''
+    numWorkers = numWorkers or os.cpu_count()
+    oShmX, tSpecX = ShareArray(mX)
+    oShmL, tSpecL = ShareArray(np.zeros(mX.shape[0], dtype = np.intp))
+    last_KMeansObj = None
+    lO = []
+    try:
+        with ProcessPoolExecutor(numWorkers, initializer = _AttachShared, initargs = ({'mX': tSpecX, 'vL': tSpecL}, )) as oPool:
+            lRanges = _ShardRanges(mX.shape[0], numWorkers)
+            for i in range(numIter):
+                lFutures = [oPool.submit(_KMeansShardWorker, ii, jj, mC, memBudget, dataType) for ii, jj in lRanges]
+                lStats = [oFuture.result() for oFuture in lFutures]
+                KMeansObj, mS, vN, numChanged = [sum(tStats[jj] for tStats in lStats) for jj in range(4)]
+                lO.append(KMeansObj)
+                if (i > 0 and numChanged == 0) or HasConverged(KMeansObj, last_KMeansObj, stopThr):
+                    break
+                vNonEmpty = vN > 0
+                mC = np.array(mC, dtype = np.float64)
+                mC[vNonEmpty] = mS[vNonEmpty] / vN[vNonEmpty, None]
+                last_KMeansObj = KMeansObj
+        vL = np.ndarray(tSpecL[1], dtype = tSpecL[2], buffer = oShmL.buf).copy()
+    finally:
+        for oShm in (oShmX, oShmL):
+            oShm.close()
+            oShm.unlink()
+    return mC, vL, lO
+#===============================================================#
+
+#===============================================================#
+def ShardedGMM(mX: np.ndarray, mμ: np.ndarray, tΣ: np.ndarray, vW: np.ndarray, numIter: int = 1000, stopThr: float = 1e-5, covType: str = 'full', regCovar: float = 1e-6, numWorkers: int = None, memBudget: int = 2 ** 28) -> np.ndarray:
+    '''
+    GMM algorithm with the samples split between worker processes.
+    Args:
+        mX          - Input data with shape N x d.
+        mμ, tΣ, vW  - The initial parameters of the GMM (See `GMM()`).
+        numIter     - Number of iterations.
+        stopThr     - Stopping threshold.
+        covType     - Covariance type (See `GMM()`).
+        regCovar    - Non negative value added to the variances so the covariances stay positive definite.
+        numWorkers  - Number of worker processes, one shard of rows per worker (Defaults to the number of CPUs).
+        memBudget   - Maximum number of bytes used for the whitened samples of a chunk of samples per worker.
+    Output:
+        mμ, tΣ, vW  - The final parameters of the GMM.
+        vL          - The labels (0, 1, .., K - 1) per sample with shape (N, )
+        lO          - The objective function value per iterations (List).
+    Remarks:
+        - Each iteration the workers return the log likelihood and the sufficient statistics of their shard
+          (See `GmmSuffStats()`), which are reduced into the parameters by `GmmStatsMStep()`.
+        - The 'full' covariances come from the second moments, so they may differ from `GMM()` by round off.
+    '''
+    CheckCovType(covType)
+    numWorkers = numWorkers or os.cpu_count()
+    oShmX, tSpecX = ShareArray(mX)
+    oShmL, tSpecL = ShareArray(np.zeros(mX.shape[0], dtype = np.intp))
+    last_Obj = None
+    lO = []
+    try:
+        with ProcessPoolExecutor(numWorkers, initializer = _AttachShared, initargs = ({'mX': tSpecX, 'vL': tSpecL}, )) as oPool:
+            lRanges = _ShardRanges(mX.shape[0], numWorkers)
+            for i in range(numIter):
+                lFutures = [oPool.submit(_GmmShardWorker, ii, jj, mμ, tΣ, vW, covType, memBudget) for ii, jj in lRanges]
+                lStats = [oFuture.result() for oFuture in lFutures]
+                Obj = sum(tStats[0] for tStats in lStats)
+                lO.append(Obj)
+                if HasConverged(Obj, last_Obj, stopThr):
+                    break
+                last_Obj = Obj
+                vN, mS, tS = [sum(tStats[jj] for tStats in lStats) for jj in (1, 2, 3)]
+                mμ, tΣ, vW = GmmStatsMStep(mX.shape[0], vN, mS, tS, covType, regCovar)
+        vL = np.ndarray(tSpecL[1], dtype = tSpecL[2], buffer = oShmL.buf).copy()
+    finally:
+        for oShm in (oShmX, oShmL):
+            oShm.close()
+            oShm.unlink()
+    return mμ, tΣ, vW, vL, lO
+#===============================================================#
+
+#===============================================================#
+def BenchmarkKMeansAccel(N: int = 100000, d: int = 8, K: int = 20, numIter: int = 100, seedNum: int = 123) -> dict:
+    '''
+    Compares the plain and the accelerated K-Means on well separated and on overlapping synthetic blobs.
+    Args:
+        N           - Number of samples.
+        d           - Dimension of the samples.
+        K           - Number of blobs and clusters.
+        numIter     - Number of iterations.
+        seedNum     - Seed number used.
+    Output:
+        dResults    - Dictionary of (blobs type, accelMethod) to (run time [Sec], number of skipped distances).
+    '''
+    oRng = np.random.default_rng(seedNum)
+    dResults = {}
+    for blobsType, blobStd in (('separated', 0.5), ('overlapping', 5.0)):
+        mCenters = oRng.uniform(-10, 10, (K, d))
+        mX = mCenters[oRng.integers(K, size = N)] + blobStd * oRng.standard_normal((N, d))
+        mC0 = mX[oRng.choice(N, K, replace = False)]
+        lLabels = []
+        for accelMethod in (0, 1):
+            dStats = {}
+            startTime = time.perf_counter()
+            _, vL, lO = KMeans(mX, mC0, numIter, accelMethod = accelMethod, dStats = dStats)
+            runTime = time.perf_counter() - startTime
+            numDist = dStats['numDistComputed'] + dStats['numDistSkipped']
+            dResults[(blobsType, accelMethod)] = (runTime, dStats['numDistSkipped'])
+            lLabels.append(vL)
+            print(f'{blobsType:>11} accelMethod = {accelMethod}: {runTime:.3f} [Sec], {len(lO)} iterations, '
+                  f'{dStats["numDistSkipped"] / numDist:.1%} of the distances skipped')
+        print(f'{blobsType:>11} labels match: {np.array_equal(lLabels[0], lLabels[1])}')
+    return dResults
+#===============================================================#
+
+
+#===============================================================#
+def BenchmarkParallelKMeans(N: int = 1000000, d: int = 8, K: int = 20, numIter: int = 20, numSeeds: int = 8, seedNum: int = 123) -> dict:
+    '''
+    Measures the speed up of the parallel restarts and of the sharded K-Means over the serial runs.
+    Args:
+        N           - Number of samples.
+        d           - Dimension of the samples.
+        K           - Number of blobs and clusters.
+        numIter     - Number of iterations.
+        numSeeds    - Number of restarts.
+        seedNum     - Seed number used.
+    Output:
+        dResults    - Dictionary of (mode, number of workers) to run time [Sec].
+    '''
+    oRng = np.random.default_rng(seedNum)
+    mCenters = oRng.uniform(-10, 10, (K, d))
+    mX = mCenters[oRng.integers(K, size = N)] + oRng.standard_normal((N, d))
+    mC0 = InitKMeans(mX, K, 0, seedNum)
+    lSeeds = list(range(seedNum, seedNum + numSeeds))
+    dResults = {}
+    startTime = time.perf_counter()
+    for seed in lSeeds:
+        KMeans(mX, InitKMeans(mX, K, 1, seed), numIter)
+    dResults[('restarts', 0)] = time.perf_counter() - startTime
+    startTime = time.perf_counter()
+    KMeans(mX, mC0, numIter)
+    dResults[('sharded', 0)] = time.perf_counter() - startTime
+    numWorkers = 1
+    while numWorkers <= os.cpu_count():
+        startTime = time.perf_counter()
+        ParallelRestarts(mX, K, lSeeds, 'KMeans', numWorkers, {'numIter': numIter})
+        dResults[('restarts', numWorkers)] = time.perf_counter() - startTime
+        startTime = time.perf_counter()
+        ShardedKMeans(mX, mC0, numIter, numWorkers = numWorkers)
+        dResults[('sharded', numWorkers)] = time.perf_counter() - startTime
+        numWorkers *= 2
+    for (benchMode, numWorkers), runTime in dResults.items():
+        if numWorkers > 0:
+            print(f'{benchMode:>8} {numWorkers:3d} workers: {runTime:.3f} [Sec], '
+                  f'speed up {dResults[(benchMode, 0)] / runTime:.2f}')
+    return dResults
+#===============================================================#
+
+
+if __name__ == '__main__':
+    BenchmarkKMeansAccel()
+    BenchmarkParallelKMeans()